@@ -2,7 +2,7 @@
 # coding: utf-8
 
 from OCC.Display.SimpleGui import init_display
-from math import radians, sin, cos, tan
+from math import radians, sin, cos, tan, ceil
 from byow.parts import Bar, Panel
 
 from byow.util import get_boundingbox, get_boundingbox_shape, make_compound
@@ -14,10 +14,20 @@ def climbing_wall(wall_width=2000.,
                   wall_angle=25.,
                   gap=100.,
                   safety=500.,
-                  holes=None):
+                  holes=None,
+                  max_span=1000.,
+                  max_panel_width=2500.,
+                  max_panel_height=1250.):
     """
     create a free standing climbing wall.
 
+    The climbable surface is split into a grid of equal plywood panels
+    that fit into `max_panel_width` x `max_panel_height`. It is carried by
+    equally spaced diagonal bars, at most `max_span` apart, with a
+    diagonal bar below every vertical panel joint. All diagonal bars and
+    all panels have the same geometry, so their shapes are built once
+    and shared.
+
     :param wall_width: the width of the climbable surface
     :param wall_height: the height of the climbable surface
     :param wall_thickness: the thickness of the plywood
@@ -28,6 +38,9 @@ def climbing_wall(wall_width=2000.,
            bars to prevent tilting
     :param holes: the holes dict for defining the panels
            of the climbable surface
+    :param max_span: the maximum distance between two diagonal bars
+    :param max_panel_width: the maximum width of a plywood panel
+    :param max_panel_height: the maximum height of a plywood panel
 
     :return: a list of parts that make up the climbing wall
     """
@@ -80,7 +93,13 @@ def climbing_wall(wall_width=2000.,
     parts.append(back)
 
 
-    # create the three diagonal bars
+    # number of panel columns and rows and the number of bays
+    # between the diagonal bars, so that every panel joint is supported
+    n_cols = max(1, ceil(wall_width / max_panel_width))
+    n_rows = max(1, ceil(wall_height / max_panel_height))
+    n_bays = n_cols * max(1, ceil(ceil(wall_width / max_span) / n_cols))
+
+    # create the diagonal bars
     dz = back._section[1] - back._section[0] * sina
     dy = back._section[0] * sina * tana
     l = wall_height + back_section[0]*tana + gap
@@ -97,37 +116,30 @@ def climbing_wall(wall_width=2000.,
     diag1.name = "diagonal bar 1"
     parts.append(diag1)
 
-    kwargs['pos'] = [0, (wall_width - horizontal_left._section[1])/2, 0]
-    kwargs['ori'] = [0, 0, 0]
-    kwargs['parent'] = diag1
-    diag2 = Bar(**kwargs)
-    diag2.name = "diagonal bar 2"
-    parts.append(diag2)
-
-    kwargs['pos'] = [0, (wall_width - horizontal_left._section[1])/2, 0]
-    kwargs['parent'] = diag2
-    diag3 = Bar(**kwargs)
-    diag3.name = "diagonal bar 3"
-    parts.append(diag3)
+    diag = diag1
+    for i in range(n_bays):
+        kwargs['pos'] = [0, (wall_width - horizontal_left._section[1]) / n_bays, 0]
+        kwargs['ori'] = [0, 0, 0]
+        kwargs['parent'] = diag
+        diag = Bar(**kwargs)
+        diag.name = "diagonal bar " + str(i + 2)
+        parts.append(diag)
 
     # add the climbing panels
-    panel_lo = Panel(pos=[tana*diag1._section[1], 0, -wall_thickness],
-                     parent=diag1,
-                     width=wall_width,
-                     height=wall_height/2,
-                     thickness=wall_thickness,
-                     holes=holes)
-    panel_lo.name = "lower plywood panel"
-    parts.append(panel_lo)
-
-    panel_hi = Panel(pos=[panel_lo._height, 0, 0],
-                     parent=panel_lo,
-                     width=wall_width,
-                     height=wall_height / 2,
-                     thickness=wall_thickness,
-                     holes=holes)
-    panel_hi.name = "upper plywood panel"
-    parts.append(panel_hi)
+    panel_width = wall_width / n_cols
+    panel_height = wall_height / n_rows
+    for i in range(n_rows):
+        for j in range(n_cols):
+            panel = Panel(pos=[tana*diag1._section[1] + i*panel_height, j*panel_width, -wall_thickness],
+                          parent=diag1,
+                          width=panel_width,
+                          height=panel_height,
+                          thickness=wall_thickness,
+                          holes=holes)
+            panel.name = "plywood panel, row " + str(i + 1)
+            if n_cols > 1:
+                panel.name += ", column " + str(j + 1)
+            parts.append(panel)
 
     # add vertical bars
     dx = 2 * back_section[0] + (wall_height + gap) * sina - front_section[0]
@@ -187,13 +199,15 @@ if __name__ == '__main__':
         if type(part) == Bar:
             print(part)
 
-    wall_compound = make_compound(parts)
+    wall_compound = make_compound(parts, exact=False)
     bb = get_boundingbox(wall_compound, use_mesh=False)
     bb_box = get_boundingbox_shape(bb)
 
     display, start_display, add_menu, add_function_to_menu = init_display()
     for part in parts:
-        display.DisplayShape(part._shape, update=False)
+        display.DisplayShape(part.light_shape, update=False)
+        if type(part) == Panel:
+            display.DisplayShape(part.hole_markers, color='black', update=False)
     display.DisplayShape(bb_box, color='red', update=False)
     display.FitAll()
     start_display()
@@ -0,0 +1,96 @@
+"""
+Drilling programs for the hole lattice of the plywood panels.
+
+The drill points are generated directly from the lattice parameters
+of a Panel, no geometry is built. Machine coordinates have their origin
+at a corner of the panel, X runs across the panel width, Y along
+the panel height and Z=0 is the top surface of the panel.
+"""
+
+
+def drill_points(panel):
+    """
+    Generates the drill points of a panel in serpentine order. The
+    lattice is swept row by row, alternating the direction, along
+    the axis that gives the shorter total travel
+
+    :param panel: a Panel instance
+
+    :return: a generator of (X, Y) tuples in machine coordinates
+    """
+    xs, ys = panel._hole_grid()
+    if not xs or not ys:
+        return
+
+    # travel of a sweep along the width and along the height
+    along_width = len(xs) * (ys[-1] - ys[0]) + (xs[-1] - xs[0])
+    along_height = len(ys) * (xs[-1] - xs[0]) + (ys[-1] - ys[0])
+
+    if along_width <= along_height:
+        for i, x in enumerate(xs):
+            for y in (ys if i % 2 == 0 else reversed(ys)):
+                yield y, x
+    else:
+        for i, y in enumerate(ys):
+            for x in (xs if i % 2 == 0 else reversed(xs)):
+                yield y, x
+
+
+def export_to_csv(filename, panel):
+    """
+    Writes the drill points of a panel to a CSV file with
+    the columns x, y and diameter in mm
+
+    :param filename: the output CSV file
+    :param panel: a Panel instance
+
+    :return: None
+    """
+    diameter = panel._holes['diameter']
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('x,y,diameter\n')
+        for x, y in drill_points(panel):
+            f.write('{:.3f},{:.3f},{:.3f}\n'.format(x, y, diameter))
+
+
+def export_to_gcode(filename,
+                    panel,
+                    feed=300.,
+                    spindle_speed=3000.,
+                    safe_height=5.,
+                    breakthrough=2.):
+    """
+    Writes a G-code drilling program for a panel. All holes are drilled
+    with a G81 canned cycle, the drill points are streamed in
+    serpentine order, so the file is written with constant memory
+
+    :param filename: the output G-code file
+    :param panel: a Panel instance
+    :param feed: the plunge feed rate in mm/min
+    :param spindle_speed: the spindle speed in rpm
+    :param safe_height: the retract height above the panel in mm
+    :param breakthrough: how far the drill goes below the panel in mm
+
+    :return: None
+    """
+    depth = -(panel._thickness + breakthrough)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('(' + (panel.name or 'panel') + ')\n')
+        f.write('(' + str(round(panel._width)) + ' x ' + str(round(panel._height)) + ' x '
+                + str(round(panel._thickness)) + ' mm, hole diameter '
+                + str(round(panel._holes['diameter'])) + ' mm)\n')
+        f.write('G21 G90 G17\n')
+        f.write('G0 Z{:.3f}\n'.format(safe_height))
+        f.write('M3 S{:.0f}\n'.format(spindle_speed))
+        first = True
+        for x, y in drill_points(panel):
+            if first:
+                f.write('G81 X{:.3f} Y{:.3f} Z{:.3f} R{:.3f} F{:.1f}\n'.format(
+                    x, y, depth, safe_height, feed))
+                first = False
+            else:
+                f.write('X{:.3f} Y{:.3f}\n'.format(x, y))
+        f.write('G80\n')
+        f.write('G0 Z{:.3f}\n'.format(safe_height))
+        f.write('M5\n')
+        f.write('M30\n')
@@ -0,0 +1,242 @@
+"""
+Dimensioned 2D shop drawings of the parts as DXF or SVG.
+
+The drawings are generated from the part parameters, no geometry is
+built or projected. A drawing is a list of primitives in mm:
+
+ - ('line', x0, y0, x1, y1)
+ - ('circle', x, y, r)
+ - ('text', x, y, height, string)
+"""
+
+import os
+
+from byow.parts import Bar, Panel
+
+TEXT_HEIGHT = 20.
+DIM_OFFSET = 40.
+SHEET_GAP = 150.
+
+
+def _dimension(x0, y0, x1, y1, text):
+    """ returns the primitives of a dimension line with ticks and a centered label """
+    dx, dy = x1 - x0, y1 - y0
+    length = (dx ** 2 + dy ** 2) ** 0.5
+    nx, ny = -dy / length * 5., dx / length * 5.
+    return [('line', x0, y0, x1, y1),
+            ('line', x0 - nx, y0 - ny, x0 + nx, y0 + ny),
+            ('line', x1 - nx, y1 - ny, x1 + nx, y1 + ny),
+            ('text', (x0 + x1) / 2. + 2 * nx, (y0 + y1) / 2. + 2 * ny, TEXT_HEIGHT, text)]
+
+
+def _bar_drawing(bar):
+    """ side view of a bar with its length, section and miter angles """
+    out = []
+    profile = bar._profile()
+    for i in range(len(profile)):
+        x0, y0 = profile[i]
+        x1, y1 = profile[(i + 1) % len(profile)]
+        out.append(('line', x0, y0, x1, y1))
+
+    out += _dimension(0, -DIM_OFFSET, bar._length, -DIM_OFFSET,
+                      str(round(bar._length)) + ' mm')
+    out += _dimension(-DIM_OFFSET, 0, -DIM_OFFSET, bar._section[1],
+                      str(round(bar._section[1])) + ' mm')
+
+    y = bar._section[1] + DIM_OFFSET
+    lines = ['# ' + bar.name,
+             str(round(bar._length)) + ' x ' + str(round(bar._section[0])) + ' x '
+             + str(round(bar._section[1])) + ' mm']
+    if bar._saw_start:
+        lines.append('left miter angle: ' + str(bar._saw_start) + ' deg')
+    if bar._saw_end:
+        lines.append('right miter angle: ' + str(bar._saw_end) + ' deg')
+    for line in reversed(lines):
+        out.append(('text', 0, y, TEXT_HEIGHT, line))
+        y += 1.5 * TEXT_HEIGHT
+    return out
+
+
+def _panel_drawing(panel):
+    """
+    top view of a panel with its size and hole lattice. X runs across
+    the panel width and Y along the height, like in the drilling programs
+    """
+    w, h = panel._width, panel._height
+    out = [('line', 0, 0, w, 0),
+           ('line', w, 0, w, h),
+           ('line', w, h, 0, h),
+           ('line', 0, h, 0, 0)]
+
+    xs, ys = panel._hole_grid()
+    r = panel._holes['diameter'] / 2.
+    for x in xs:
+        for y in ys:
+            out.append(('circle', y, x, r))
+
+    out += _dimension(0, -DIM_OFFSET, w, -DIM_OFFSET, str(round(w)) + ' mm')
+    out += _dimension(-DIM_OFFSET, 0, -DIM_OFFSET, h, str(round(h)) + ' mm')
+    if xs and ys:
+        out += _dimension(0, -2 * DIM_OFFSET, ys[0], -2 * DIM_OFFSET,
+                          str(round(panel._holes['y_start'])))
+        out += _dimension(-2 * DIM_OFFSET, 0, -2 * DIM_OFFSET, xs[0],
+                          str(round(panel._holes['x_start'])))
+
+    y = h + DIM_OFFSET
+    lines = ['# ' + panel.name,
+             str(round(w)) + ' x ' + str(round(h)) + ' x ' + str(round(panel._thickness)) + ' mm',
+             str(len(xs) * len(ys)) + ' holes, diameter ' + str(round(panel._holes['diameter'])) + ' mm',
+             'horizontal spacing ' + str(round(panel._holes['y_dist'])) + ' mm, vertical spacing '
+             + str(round(panel._holes['x_dist'])) + ' mm']
+    for line in reversed(lines):
+        out.append(('text', 0, y, TEXT_HEIGHT, line))
+        y += 1.5 * TEXT_HEIGHT
+    return out
+
+
+def part_drawing(part):
+    """
+    returns the drawing primitives of a part
+
+    :param part: a Bar or Panel instance
+
+    :return: a list of primitives
+    """
+    if isinstance(part, Bar):
+        return _bar_drawing(part)
+    if isinstance(part, Panel):
+        return _panel_drawing(part)
+    raise TypeError("no drawing for " + type(part).__name__)
+
+
+def _bounds(primitives):
+    """ returns (xmin, ymin, xmax, ymax) of a list of primitives """
+    xs, ys = [], []
+    for p in primitives:
+        if p[0] == 'line':
+            xs += [p[1], p[3]]
+            ys += [p[2], p[4]]
+        elif p[0] == 'circle':
+            xs += [p[1] - p[3], p[1] + p[3]]
+            ys += [p[2] - p[3], p[2] + p[3]]
+        else:
+            xs += [p[1], p[1] + 0.6 * p[3] * len(p[4])]
+            ys += [p[2], p[2] + p[3]]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _translate(primitives, dx, dy):
+    out = []
+    for p in primitives:
+        if p[0] == 'line':
+            out.append(('line', p[1] + dx, p[2] + dy, p[3] + dx, p[4] + dy))
+        else:
+            out.append((p[0], p[1] + dx, p[2] + dy) + tuple(p[3:]))
+    return out
+
+
+def cut_sheet(parts):
+    """
+    returns the drawings of several parts stacked on one sheet
+
+    :param parts: a list of Bar and Panel instances
+
+    :return: a list of primitives
+    """
+    out = []
+    y = 0.
+    for part in parts:
+        primitives = part_drawing(part)
+        xmin, ymin, xmax, ymax = _bounds(primitives)
+        out += _translate(primitives, -xmin, y - ymin)
+        y += ymax - ymin + SHEET_GAP
+    return out
+
+
+def _to_svg(primitives):
+    xmin, ymin, xmax, ymax = _bounds(primitives)
+    width, height = xmax - xmin, ymax - ymin
+
+    # SVG's y-axis points down
+    def px(x):
+        return '{:.2f}'.format(x - xmin)
+
+    def py(y):
+        return '{:.2f}'.format(ymax - y)
+
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0:.0f}mm" height="{1:.0f}mm" '
+           'viewBox="0 0 {0:.2f} {1:.2f}">'.format(width, height),
+           '<g fill="none" stroke="black" stroke-width="1">']
+    for p in primitives:
+        if p[0] == 'line':
+            out.append('<line x1="' + px(p[1]) + '" y1="' + py(p[2]) + '" x2="' + px(p[3])
+                       + '" y2="' + py(p[4]) + '"/>')
+        elif p[0] == 'circle':
+            out.append('<circle cx="' + px(p[1]) + '" cy="' + py(p[2])
+                       + '" r="{:.2f}"/>'.format(p[3]))
+    out.append('</g>')
+    out.append('<g fill="black" font-family="sans-serif">')
+    for p in primitives:
+        if p[0] == 'text':
+            text = p[4].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            out.append('<text x="' + px(p[1]) + '" y="' + py(p[2])
+                       + '" font-size="{:.2f}">'.format(p[3]) + text + '</text>')
+    out.append('</g>')
+    out.append('</svg>')
+    return '\n'.join(out) + '\n'
+
+
+def _to_dxf(primitives):
+    out = ['0', 'SECTION', '2', 'ENTITIES']
+    for p in primitives:
+        if p[0] == 'line':
+            out += ['0', 'LINE', '8', '0',
+                    '10', str(p[1]), '20', str(p[2]), '30', '0.0',
+                    '11', str(p[3]), '21', str(p[4]), '31', '0.0']
+        elif p[0] == 'circle':
+            out += ['0', 'CIRCLE', '8', '0',
+                    '10', str(p[1]), '20', str(p[2]), '30', '0.0',
+                    '40', str(p[3])]
+        else:
+            out += ['0', 'TEXT', '8', '0',
+                    '10', str(p[1]), '20', str(p[2]), '30', '0.0',
+                    '40', str(p[3]), '1', p[4]]
+    out += ['0', 'ENDSEC', '0', 'EOF']
+    return '\n'.join(out) + '\n'
+
+
+def export_drawing(filename, parts):
+    """
+    Writes a drawing of one or several parts. The format is chosen
+    by the file extension, '.dxf' or '.svg'
+
+    :param filename: the output file
+    :param parts: a Part instance or a list of Part instances for a cut sheet
+
+    :return: None
+    """
+    if not isinstance(parts, list):
+        parts = [parts]
+    primitives = cut_sheet(parts)
+    if filename.lower().endswith('.dxf'):
+        content = _to_dxf(primitives)
+    elif filename.lower().endswith('.svg'):
+        content = _to_svg(primitives)
+    else:
+        raise ValueError("unknown drawing format: " + filename)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def export_drawings(directory, parts, fmt='svg'):
+    """
+    Writes one drawing per part into a directory
+
+    :param directory: the output directory
+    :param parts: a list of Part instances
+    :param fmt: 'svg' or 'dxf'
+
+    :return: None
+    """
+    for i, part in enumerate(parts):
+        export_drawing(os.path.join(directory, 'part_' + str(i + 1) + '.' + fmt), part)
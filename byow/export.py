@@ -0,0 +1,96 @@
+from byow.climbing_wall import climbing_wall
+from byow.drawings import export_drawing
+from byow.util import export_to_step, export_to_directory
+
+
+class ExportCanceled(Exception):
+    pass
+
+
+def export_wall(filename_stp, wall, shopping_list, progress=None, cancel=None):
+    """
+    Builds a wall from a snapshot of its parameters and writes the STEP
+    file, the Markdown shopping list and the SVG/DXF cut sheets. This is
+    meant to run in a separate process, so that the GUI stays responsive
+
+    :param filename_stp: The output STEP file. The other files get the
+                         same name with a different suffix
+    :param wall: the wall dict with the keyword arguments of `climbing_wall`
+    :param shopping_list: the shopping list as a string
+    :param progress: None or a function progress(step, steps, message)
+    :param cancel: None or an Event. If it is set, the export stops
+                   before the next step and raises ExportCanceled
+
+    :return: None
+    """
+    parts = climbing_wall(**wall)
+    steps = len(parts) + 2
+
+    def report(step, message):
+        if cancel is not None and cancel.is_set():
+            raise ExportCanceled()
+        if progress is not None:
+            progress(step, steps, message)
+
+    # building the exact shapes, i.e. drilling the panels, is the expensive part
+    for i, part in enumerate(parts):
+        report(i, "Building " + part.name)
+        part.shape
+
+    report(len(parts), "Writing STEP file")
+    export_to_step(filename_stp, parts)
+
+    report(len(parts) + 1, "Writing shopping list and cut sheets")
+    with open(filename_stp[0:-3] + 'md', 'w', encoding='utf-8') as f:
+        f.write(shopping_list)
+    export_drawing(filename_stp[0:-3] + 'svg', parts)
+    export_drawing(filename_stp[0:-3] + 'dxf', parts)
+    if progress is not None:
+        progress(steps, steps, "Done")
+
+
+def export_wall_directory(directory, wall, progress=None, cancel=None):
+    """
+    Builds a wall from a snapshot of its parameters and writes one STEP
+    file per part into a directory. Only parts that changed since the
+    last export into this directory are built and written, see
+    `export_to_directory`
+
+    :param directory: The output directory
+    :param wall: the wall dict with the keyword arguments of `climbing_wall`
+    :param progress: None or a function progress(step, steps, message)
+    :param cancel: None or an Event. If it is set, the export stops
+                   before the next part and raises ExportCanceled
+
+    :return: None
+    """
+    parts = climbing_wall(**wall)
+
+    def report(step, steps, message):
+        if cancel is not None and cancel.is_set():
+            raise ExportCanceled()
+        if progress is not None:
+            progress(step, steps, message)
+
+    export_to_directory(directory, parts, report)
+    if progress is not None:
+        progress(len(parts), len(parts), "Done")
+
+
+def export_process(export, args, queue, cancel):
+    """
+    Entry point of an export process. Calls export(*args, progress, cancel)
+    and reports progress, errors and the end of the export as tuples
+    to `queue`: ('progress', step, steps, message), ('error', message),
+    ('canceled',) or ('done',)
+    """
+    try:
+        export(*args,
+               progress=lambda step, steps, message: queue.put(('progress', step, steps, message)),
+               cancel=cancel)
+    except ExportCanceled:
+        queue.put(('canceled',))
+    except Exception as e:
+        queue.put(('error', str(e)))
+    else:
+        queue.put(('done',))
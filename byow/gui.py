@@ -1,16 +1,34 @@
+import os
 import sys
+import json
+import queue
+import multiprocessing
+from collections import OrderedDict
+from copy import deepcopy
 from math import floor, ceil, sin, radians
 
 import qdarkstyle
 
 from byow.climbing_wall import climbing_wall
-from byow.parts import Bar, Panel
-from byow.util import make_compound, get_boundingbox_shape, get_boundingbox, export_to_step
+from byow.parts import Bar, Panel, _cached
+from byow.util import make_compound, get_boundingbox_shape, get_boundingbox
+from byow.stability import tipping_check
+from byow.history import WallHistory
+from byow.joints import fastener_schedule
+from byow.cnc import export_to_gcode, export_to_csv
+from byow.export import export_process, export_wall, export_wall_directory
+from byow.statistics import wall_statistics, check_budget, statistics_to_str, shape_bytes, DEFAULT_BUDGET
 
 from OCC.Display.backend import load_any_qt_backend, get_qt_modules
 load_any_qt_backend()
 QtCore, QtGui, QtWidgets, QtOpenGL = get_qt_modules()
 from OCC.Display.qtDisplay import qtViewer3d
+from OCC.Core.AIS import AIS_PointCloud
+from OCC.Core.Aspect import Aspect_TOM_POINT
+from OCC.Core.Graphic3d import Graphic3d_ArrayOfPoints, Graphic3d_ClipPlane
+from OCC.Core.Prs3d import Prs3d_PointAspect
+from OCC.Core.Quantity import Quantity_Color, Quantity_NOC_BLACK
+from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Pln
 
 
 class Controller(QtWidgets.QFrame):
@@ -19,7 +37,7 @@ class Controller(QtWidgets.QFrame):
     The QDoubleSpinbox and QDial modify the same value
     """
 
-    def __init__(self, label_text, unit_text, keys, min, max, *args):
+    def __init__(self, label_text, unit_text, keys, min, max, *args, settings='wall'):
         """
         Initializer of the Controller
 
@@ -33,6 +51,9 @@ class Controller(QtWidgets.QFrame):
         :param min: Maximum value used for the spinbox/dial
         :param *args: Any additional arguments passed to the initializer of
                       the parent widget
+        :param settings: The name of the app's dict that holds the value.
+                         Only changes of the 'wall' dict trigger a recalculation,
+                         only 'wall' and 'settings' update the results
 
         :return: None
         """
@@ -47,6 +68,7 @@ class Controller(QtWidgets.QFrame):
         self.setMinimum(min)
         self.setMaximum(max)
         self.keys = keys
+        self.settings = settings
         self.setValue()
 
         self.setLayout(QtWidgets.QVBoxLayout())
@@ -63,10 +85,15 @@ class Controller(QtWidgets.QFrame):
         self.spinbox.valueChanged.connect(self.dial.setValue)
         self.spinbox.valueChanged.connect(self.update_wall)
 
-        self.spinbox.editingFinished.connect(app.viewer.trigger_redraw)
-        self.dial.sliderReleased.connect(app.viewer.trigger_redraw)
-        self.spinbox.editingFinished.connect(app.shopping_list)
-        self.dial.sliderReleased.connect(app.shopping_list)
+        # only the wall and the stability settings change the results,
+        # other values like the section planes are applied by their owner
+        if settings in ('wall', 'settings'):
+            self.spinbox.valueChanged.connect(app.prefetcher.cancel)
+            self.spinbox.valueChanged.connect(app.update_stability)
+            self.spinbox.editingFinished.connect(app.viewer.trigger_redraw)
+            self.dial.sliderReleased.connect(app.viewer.trigger_redraw)
+            self.spinbox.editingFinished.connect(app.shopping_list)
+            self.dial.sliderReleased.connect(app.shopping_list)
 
         # set size policies and style
         self.dial.setSizePolicy(QtWidgets.QSizePolicy.Expanding,
@@ -91,9 +118,9 @@ class Controller(QtWidgets.QFrame):
     def setValue(self):
 
         app = QtWidgets.QApplication.instance()
-        dict = app.wall
+        dict = getattr(app, self.settings)
         for i in range(0, len(self.keys)-1):
-            dict = app.wall[self.keys[i]]
+            dict = dict[self.keys[i]]
 
         self.dial.setValue(dict[self.keys[-1]])
         self.spinbox.setValue(dict[self.keys[-1]])
@@ -101,11 +128,167 @@ class Controller(QtWidgets.QFrame):
     def update_wall(self):
 
         app = QtWidgets.QApplication.instance()
-        dict = app.wall
+        dict = getattr(app, self.settings)
         for i in range(0, len(self.keys) - 1):
-            dict = app.wall[self.keys[i]]
+            dict = dict[self.keys[i]]
         dict[self.keys[-1]] = self.dial.value()
-        app.valid = False
+        if self.settings == 'wall':
+            app.valid = False
+            app.last_controller = self
+
+
+class Prefetcher(QtCore.QObject):
+    """
+    Precomputes walls for neighboring values of the last used Controller
+    while the GUI is idle. The work is split into small steps, one per
+    part, that run from a zero-interval timer, so pending events are
+    always processed first and the prefetch can be canceled between
+    any two steps.
+    """
+
+    def __init__(self, steps=(1, -1, 5, -5), cache_size=8, parent=None):
+        """
+        :param steps: the offsets from the current value that are prefetched
+        :param cache_size: the maximum number of prefetched walls
+        :param parent: the parent QObject
+        """
+        super().__init__(parent)
+        self.steps = steps
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._work = None
+        self._timer = QtCore.QTimer()
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._step)
+
+    def start(self, controller):
+        """ starts prefetching neighboring values of `controller` """
+        self.cancel()
+        self._work = self._prefetch(controller)
+        self._timer.start()
+
+    def cancel(self):
+        """ stops prefetching immediately """
+        self._timer.stop()
+        self._work = None
+
+    def get(self, wall):
+        """ returns a prefetched state for the wall dict or None """
+        key = json.dumps(wall, sort_keys=True)
+        state = self._cache.get(key)
+        if state is not None:
+            self._cache.move_to_end(key)
+        return state
+
+    def _prefetch(self, controller):
+        app = QtWidgets.QApplication.instance()
+        value = controller.dial.value()
+        for step in self.steps:
+            if not controller.dial.minimum() <= value + step <= controller.dial.maximum():
+                continue
+            wall = deepcopy(app.wall)
+            dict = wall
+            for i in range(0, len(controller.keys) - 1):
+                dict = dict[controller.keys[i]]
+            dict[controller.keys[-1]] = value + step
+            key = json.dumps(wall, sort_keys=True)
+            if key in self._cache:
+                continue
+            for state in app.wall_states(wall):
+                yield
+            self._cache[key] = state
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _step(self):
+        try:
+            next(self._work)
+        except StopIteration:
+            self.cancel()
+
+
+class ExportJob(QtCore.QObject):
+    """
+    Runs an export in a separate process and shows its progress in a
+    non-modal progress dialog that allows to cancel the export
+    """
+
+    def __init__(self, label, export, args, on_finished=None, parent=None):
+        """
+        :param label: the text of the progress dialog
+        :param export: a function of byow.export, e.g. export_wall
+        :param args: the arguments of `export` without progress and cancel
+        :param on_finished: None or a function that is called with
+                            the job when the export has ended
+        :param parent: the parent widget of the progress dialog
+        """
+        super().__init__(parent)
+        self._parent = parent
+        self._on_finished = on_finished
+        self._finished = False
+
+        context = multiprocessing.get_context('spawn')
+        self._queue = context.Queue()
+        self._cancel = context.Event()
+        self._process = context.Process(target=export_process,
+                                        args=(export, args, self._queue, self._cancel))
+
+        self.dialog = QtWidgets.QProgressDialog(label, "Cancel", 0, 1, parent)
+        self.dialog.setWindowModality(QtCore.Qt.NonModal)
+        self.dialog.setMinimumDuration(0)
+        self.dialog.canceled.connect(self.cancel)
+
+        self._timer = QtCore.QTimer()
+        self._timer.setInterval(100)
+        self._timer.timeout.connect(self._poll)
+
+    def start(self):
+        self._process.start()
+        self._timer.start()
+        self.dialog.show()
+
+    def cancel(self):
+        """
+        asks the export to stop before its next step. Writing the STEP file
+        cannot be interrupted, so the process is terminated if it does
+        not stop within two seconds
+        """
+        self._cancel.set()
+        QtCore.QTimer.singleShot(2000, self._terminate)
+
+    def _terminate(self):
+        if not self._finished and self._process.is_alive():
+            self._process.terminate()
+            self._finish()
+
+    def _poll(self):
+        alive = self._process.is_alive()
+        while not self._finished:
+            try:
+                msg = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if msg[0] == 'progress':
+                self.dialog.setMaximum(msg[2])
+                self.dialog.setValue(msg[1])
+                self.dialog.setLabelText(msg[3])
+            elif msg[0] == 'error':
+                self._finish()
+                QtWidgets.QMessageBox.warning(self._parent, 'Export failed', msg[1])
+            else:
+                self._finish()
+        if not alive and not self._finished:
+            self._finish()
+            QtWidgets.QMessageBox.warning(self._parent, 'Export failed', 'The export process ended unexpectedly')
+
+    def _finish(self):
+        self._finished = True
+        self._timer.stop()
+        self.dialog.canceled.disconnect(self.cancel)
+        self.dialog.close()
+        self._process.join(1)
+        if self._on_finished is not None:
+            self._on_finished(self)
 
 
 class ControllerTab(QtWidgets.QWidget):
@@ -113,15 +296,28 @@ class ControllerTab(QtWidgets.QWidget):
     def __init__(self, *args):
         super().__init__(*args)
         self.ndials = 0
+        self.controllers = []
         self.setLayout(QtWidgets.QGridLayout())
 
     def append(self, controller):
         i = floor(self.ndials / 2.)
         j = ceil(self.ndials / 2. - i)
         self.layout().addWidget(controller, i, j)
+        self.controllers.append(controller)
         self.ndials += 1
 
 
+# display modes of the panels in the viewer:
+#  - slabs: the undrilled panels only
+#  - points: slabs and one array of point markers per panel at the hole centers
+#  - outlines: slabs and the circular rims of the holes
+#  - exact: the drilled panels
+DISPLAY_MODES = ['slabs', 'points', 'outlines', 'exact']
+
+# number of panel geometries whose hole point arrays are kept
+HOLE_ARRAY_CACHE_SIZE = 16
+
+
 class Viewer3d(qtViewer3d):
 
     def __init__(self, *args):
@@ -140,20 +336,119 @@ class Viewer3d(qtViewer3d):
         self._display.View_Front = FitAllDecorator(self._display.View_Front)
         self._display.View_Rear = FitAllDecorator(self._display.View_Rear)
 
+        # how the panels are drawn, see DISPLAY_MODES
+        self.display_mode = 'points'
+        # hole point arrays by panel geometry, see _hole_points
+        self._hole_arrays = OrderedDict()
+
+        # cutaway views: one clipping plane per global axis. The planes
+        # are applied at render time, moving them needs no recalculation
+        self._clip_planes = {}
+        for axis in 'xyz':
+            plane = Graphic3d_ClipPlane()
+            plane.SetCapping(True)
+            plane.SetOn(False)
+            self._display.View.AddClipPlane(plane)
+            self._clip_planes[axis] = plane
+
     def trigger_redraw(self):
         app = QtWidgets.QApplication.instance()
         if not app.valid:
             app.calc()
             self._redraw()
+            if app.last_controller is not None:
+                app.prefetcher.start(app.last_controller)
+
+    def set_display_mode(self, mode):
+        """
+        sets how the panels are drawn and redraws the wall
+
+        :param mode: one of DISPLAY_MODES
+        """
+        self.display_mode = mode
+        app = QtWidgets.QApplication.instance()
+        if app.wall_shape is not None:
+            self._redraw()
+
+    def update_clip_planes(self):
+        """
+        moves the clipping planes to the positions in the app's section
+        dict. A position is given in percent of the bounding box along the
+        axis. The part of the wall beyond that position is cut away, at
+        100 percent the plane is switched off
+        """
+        app = QtWidgets.QApplication.instance()
+        if app.bb_dict is None:
+            return
+        for i, axis in enumerate('xyz'):
+            fraction = app.section[axis] / 100.
+            plane = self._clip_planes[axis]
+            plane.SetOn(fraction < 1.)
+            pnt = [0., 0., 0.]
+            pnt[i] = app.bb_dict[axis + 'min'] + fraction * app.bb_dict['d' + axis]
+            normal = [0., 0., 0.]
+            normal[i] = -1.
+            plane.SetEquation(gp_Pln(gp_Pnt(*pnt), gp_Dir(*normal)))
+        self._display.View.Redraw()
+
+    def _hole_points(self, panel):
+        """
+        returns the hole centers of a panel as a point array in local
+        coordinates. Panels with equal geometry share one array, so it
+        is only filled once
+        """
+        def compute():
+            points = panel.hole_centers()
+            array = Graphic3d_ArrayOfPoints(len(points))
+            for p in points:
+                array.AddVertex(gp_Pnt(*p))
+            return array
+        return _cached(self._hole_arrays, HOLE_ARRAY_CACHE_SIZE, panel._geometry_key(), compute)
+
+    def _display_points(self, panel):
+        """
+        displays the holes of a panel as one array of point markers. The
+        presentation is a single primitive array, independent of the number
+        of points, and needs no special OpenGL features
+        """
+        cloud = AIS_PointCloud()
+        cloud.SetPoints(self._hole_points(panel))
+        cloud.SetLocalTransformation(panel.transformation)
+        aspect = Prs3d_PointAspect(Aspect_TOM_POINT, Quantity_Color(Quantity_NOC_BLACK), 3.)
+        cloud.Attributes().SetPointAspect(aspect)
+        self._display.Context.Display(cloud, False)
 
     def _redraw(self):
         app = QtWidgets.QApplication.instance()
         self._display.EraseAll()
         parts = app.wall_shape
+        mode = self.display_mode
+
+        # drop to cheaper representations of the holes above the budgets
+        if mode == 'exact' and check_budget(wall_statistics(parts, exact=True), app.budget):
+            mode = 'points'
+            app.window.statusBar().showMessage("The drilled panels exceed the budget, holes are shown as points")
+        n_holes = sum(part._topology(exact=False)['holes'] for part in parts)
+        if mode == 'outlines' and n_holes > app.budget['hole_markers']:
+            mode = 'points'
+            app.window.statusBar().showMessage(str(n_holes) + " holes exceed the marker budget, holes are shown as points")
+        if mode == 'points' and n_holes > app.budget['hole_points']:
+            mode = 'slabs'
+            app.window.statusBar().showMessage(str(n_holes) + " holes exceed the point budget, holes are not shown")
+
         for part in parts:
-            self._display.DisplayShape(part._shape, update=False)
+            if mode == 'exact':
+                self._display.DisplayShape(part.shape, update=False)
+            else:
+                self._display.DisplayShape(part.light_shape, update=False)
+            if isinstance(part, Panel):
+                if mode == 'outlines':
+                    self._display.DisplayShape(part.hole_markers, color='black', update=False)
+                elif mode == 'points':
+                    self._display_points(part)
         self._display.DisplayShape(app.bb_shape, color='red', update=False)
         self._display.FitAll()
+        self.update_clip_planes()
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -170,8 +465,33 @@ class MainWindow(QtWidgets.QMainWindow):
         export_action.setStatusTip('Export to STEP file')
         export_action.triggered.connect(self.file_save)
 
+        # one STEP file per part, only changed parts are written
+        directory_action = QtWidgets.QAction("Export to &Directory", self)
+        directory_action.setStatusTip('Export each part to its own STEP file, skipping unchanged parts')
+        directory_action.triggered.connect(self.directory_save)
+
+        # drilling programs for the panels
+        drill_action = QtWidgets.QAction("Export &Drilling Programs", self)
+        drill_action.setStatusTip('Export G-code and CSV drill points for each panel')
+        drill_action.triggered.connect(self.drill_save)
+
+        # undo and redo of wall parameters
+        undo_action = QtWidgets.QAction("&Undo", self)
+        undo_action.setShortcut("Ctrl+Z")
+        undo_action.setStatusTip('Restore the previous wall parameters')
+        undo_action.triggered.connect(lambda: QtWidgets.QApplication.instance().undo())
+
+        redo_action = QtWidgets.QAction("&Redo", self)
+        redo_action.setShortcut("Ctrl+Y")
+        redo_action.setStatusTip('Restore the next wall parameters')
+        redo_action.triggered.connect(lambda: QtWidgets.QApplication.instance().redo())
+
         self.menu_bar = self.menuBar()
         self.menu_bar.addAction(export_action)
+        self.menu_bar.addAction(directory_action)
+        self.menu_bar.addAction(drill_action)
+        self.menu_bar.addAction(undo_action)
+        self.menu_bar.addAction(redo_action)
 
         # central frame
         self.frame = QtWidgets.QFrame()
@@ -245,6 +565,12 @@ class MainWindow(QtWidgets.QMainWindow):
         button_rear.clicked.connect(lambda: app.viewer._display.View_Rear())
         bottom_buttons.layout().addWidget(button_rear)
 
+        display_mode = QtWidgets.QComboBox(self)
+        display_mode.addItems(DISPLAY_MODES)
+        display_mode.setCurrentText(app.viewer.display_mode)
+        display_mode.currentTextChanged.connect(app.viewer.set_display_mode)
+        bottom_buttons.layout().addWidget(display_mode)
+
         self.tabs = QtWidgets.QTabWidget()
         self.tabs.setSizePolicy(QtWidgets.QSizePolicy.Minimum,
                                 QtWidgets.QSizePolicy.Minimum)
@@ -252,8 +578,18 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.wall_parameters = ControllerTab()
         self.panel_parameters = ControllerTab()
+        self.stability_parameters = ControllerTab()
         self.tabs.addTab(self.wall_parameters, "Wall Parameters")
         self.tabs.addTab(self.panel_parameters, "Panel Parameters")
+        self.section_parameters = ControllerTab()
+        self.tabs.addTab(self.stability_parameters, "Stability")
+        self.tabs.addTab(self.section_parameters, "Section")
+        self.preference_parameters = ControllerTab()
+        self.tabs.addTab(self.preference_parameters, "Preferences")
+
+        self.statistics_text = QtWidgets.QTextEdit()
+        self.statistics_text.setReadOnly(True)
+        self.tabs.addTab(self.statistics_text, "Statistics")
 
         self.width_controller = Controller("Width",
                                            "mm",
@@ -290,6 +626,13 @@ class MainWindow(QtWidgets.QMainWindow):
                                             8000)
         self.wall_parameters.append(self.safety_controller)
 
+        self.span_controller = Controller("Max. Diagonal Bar Spacing",
+                                          "mm",
+                                          ["max_span", ],
+                                          200,
+                                          8000)
+        self.wall_parameters.append(self.span_controller)
+
         self.thickness_controller = Controller("Thickness",
                                                "mm",
                                                ["wall_thickness", ],
@@ -332,9 +675,65 @@ class MainWindow(QtWidgets.QMainWindow):
                                             1000)
         self.panel_parameters.append(self.y_dist_controller)
 
+        self.density_controller = Controller("Wood density",
+                                             "kg/m^3",
+                                             ["density", ],
+                                             100,
+                                             1200,
+                                             settings='settings')
+        self.stability_parameters.append(self.density_controller)
+
+        self.climber_controller = Controller("Climber mass",
+                                             "kg",
+                                             ["climber_mass", ],
+                                             10,
+                                             200,
+                                             settings='settings')
+        self.stability_parameters.append(self.climber_controller)
+
+        for axis in 'xyz':
+            controller = Controller("Section " + axis + "-direction",
+                                    "%",
+                                    [axis, ],
+                                    0,
+                                    100,
+                                    settings='section')
+            controller.spinbox.valueChanged.connect(app.viewer.update_clip_planes)
+            self.section_parameters.append(controller)
+
+        self.history_controller = Controller("Undo history memory",
+                                             "MB",
+                                             ["history_mb", ],
+                                             10,
+                                             4000,
+                                             settings='preferences')
+        self.history_controller.spinbox.valueChanged.connect(app.update_history_memory)
+        self.preference_parameters.append(self.history_controller)
+
+        budgets = [("Max. faces", "", "max_faces", 1000, 1000000),
+                   ("Max. memory", "MB", "max_memory_mb", 10, 16000),
+                   ("Max. build time", "s", "max_time", 1, 3600),
+                   ("Max. hole outlines", "", "max_hole_markers", 0, 100000),
+                   ("Max. hole points", "", "max_hole_points", 0, 5000000)]
+        for label, unit, key, lowest, highest in budgets:
+            controller = Controller(label, unit, [key, ], lowest, highest, settings='preferences')
+            controller.spinbox.valueChanged.connect(app.update_budget)
+            self.preference_parameters.append(controller)
+
+        # running background exports
+        self.export_jobs = []
+
         self.splitter.setSizes([1200, 100])
         self.showMaximized()
 
+    def update_controllers(self):
+        """ sets all controllers to the values of the app's dicts """
+        for tab in [self.wall_parameters, self.panel_parameters,
+                    self.stability_parameters, self.section_parameters,
+                    self.preference_parameters]:
+            for controller in tab.controllers:
+                controller.setValue()
+
     def file_save(self):
         dialog = QtWidgets.QFileDialog()
         dialog.setFilter(dialog.filter() | QtCore.QDir.Hidden)
@@ -344,11 +743,42 @@ class MainWindow(QtWidgets.QMainWindow):
         if dialog.exec_() == QtWidgets.QDialog.Accepted:
             filename_stp = dialog.selectedFiles()[0]
             app = QtWidgets.QApplication.instance()
-            export_to_step(filename_stp, app.wall_shape)
 
-            filename_md = filename_stp[0:-3] + 'md'
-            with open(filename_md, 'w', encoding='utf-8') as f:
-                f.write(app.wall_to_str())
+            # warn before building exact shapes that exceed the budget
+            warnings = check_budget(wall_statistics(app.wall_shape, exact=True), app.budget)
+            if warnings:
+                answer = QtWidgets.QMessageBox.question(
+                    self, 'Expensive export', '\n'.join(warnings) + '\n\nExport anyway?')
+                if answer != QtWidgets.QMessageBox.Yes:
+                    return
+
+            # the export runs in the background on a snapshot of the wall,
+            # so that editing can go on
+            job = ExportJob("Exporting " + os.path.basename(filename_stp), export_wall,
+                            (filename_stp, deepcopy(app.wall), app.wall_to_str()),
+                            self.export_jobs.remove, self)
+            self.export_jobs.append(job)
+            job.start()
+
+    def directory_save(self):
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, 'Export Parts to Directory')
+        if directory:
+            app = QtWidgets.QApplication.instance()
+            job = ExportJob("Exporting parts to " + directory, export_wall_directory,
+                            (directory, deepcopy(app.wall)),
+                            self.export_jobs.remove, self)
+            self.export_jobs.append(job)
+            job.start()
+
+    def drill_save(self):
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, 'Export Drilling Programs')
+        if directory:
+            app = QtWidgets.QApplication.instance()
+            panels = [part for part in app.wall_shape if type(part) == Panel]
+            for i, panel in enumerate(panels):
+                filename = os.path.join(directory, 'panel_' + str(i + 1))
+                export_to_gcode(filename + '.nc', panel)
+                export_to_csv(filename + '.csv', panel)
 
 
 class BYOWApp(QtWidgets.QApplication):
@@ -364,6 +794,7 @@ class BYOWApp(QtWidgets.QApplication):
                       'wall_angle': 22,
                       'gap': 75,
                       'safety': 733,
+                      'max_span': 1000,
                       'holes': {
                           'x_start': 100.,
                           'x_dist': 200.,
@@ -373,29 +804,138 @@ class BYOWApp(QtWidgets.QApplication):
                       }
                       }
 
+        # settings that do not change the geometry
+        self.settings = {'density': 500,
+                         'climber_mass': 100}
+
+        # positions of the section planes in percent of the bounding box
+        self.section = {'x': 100, 'y': 100, 'z': 100}
+
         self.parts = None
         self.wall_shape = None
         self.bb_dict = None
         self.bb_shape = None
         self.valid = False
 
+        # application preferences. The budgets are given in MB and s
+        self.preferences = {'history_mb': 500,
+                            'max_faces': DEFAULT_BUDGET['faces'],
+                            'max_memory_mb': DEFAULT_BUDGET['memory'] * 1e-6,
+                            'max_time': DEFAULT_BUDGET['time'],
+                            'max_hole_markers': DEFAULT_BUDGET['hole_markers'],
+                            'max_hole_points': DEFAULT_BUDGET['hole_points']}
+
+        # undo/redo history. At most `size` parameter snapshots are kept,
+        # the computed geometry only for the closest ones that fit into
+        # the memory set in the preferences
+        self.history = WallHistory(size=100, memory=self.preferences['history_mb'] * 1e6)
+
+        # idle-time precomputation of neighboring values of the last used controller
+        self.prefetcher = Prefetcher(steps=(1, -1, 5, -5), cache_size=8)
+        self.last_controller = None
+
+        # budgets for faces, memory, build time and the number of hole
+        # markers and points, set from the preferences
+        self.budget = None
+        self.update_budget()
+
         self.viewer = Viewer3d()
         self.window = MainWindow()
         self.setActiveWindow(self.window)
 
+    def wall_states(self, wall):
+        """
+        computes the state of a wall in small steps. This generator
+        yields None after each step and finally the computed state, a
+        dict with the parts, bounding box and bounding box shape
+
+        :param wall: the wall dict
+        """
+        parts = climbing_wall(**wall)
+        for part in parts:
+            part.light_shape
+            yield None
+        bb_dict = get_boundingbox(make_compound(parts, exact=False), use_mesh=False)
+        yield None
+        yield {'wall_shape': parts,
+               'bb_dict': bb_dict,
+               'bb_shape': get_boundingbox_shape(bb_dict)}
+
     def calc(self):
-        self.wall_shape = climbing_wall(**self.wall)
-        wall_compound = make_compound(self.wall_shape)
-        self.bb_dict = get_boundingbox(wall_compound, use_mesh=False)
-        self.bb_shape = get_boundingbox_shape(self.bb_dict)
+        self.prefetcher.cancel()
+        state = self.prefetcher.get(self._wall)
+        if state is None:
+            for state in self.wall_states(self._wall):
+                pass
+        self.wall_shape = state['wall_shape']
+        self.bb_dict = state['bb_dict']
+        self.bb_shape = state['bb_shape']
         self.valid = True
+        self.history.push(self._wall, self._state(), shape_bytes(self.wall_shape))
+
+    def _state(self):
+        """ returns the computed state of the wall for the history """
+        return {'wall_shape': self.wall_shape,
+                'bb_dict': self.bb_dict,
+                'bb_shape': self.bb_shape,
+                'settings': dict(self.settings),
+                'shopping_list': self.wall_to_str()}
+
+    def _restore(self, wall, state):
+        """
+        restores wall parameters from the history. The computed state
+        is reused if the history still holds it, otherwise the wall
+        is recalculated
+        """
+        self._wall = wall
+        self.window.update_controllers()
+        if state is None:
+            self.calc()
+        else:
+            self.wall_shape = state['wall_shape']
+            self.bb_dict = state['bb_dict']
+            self.bb_shape = state['bb_shape']
+            self.valid = True
+        self.viewer._redraw()
+        if state is not None and state['settings'] == self.settings:
+            self.window.shopping_list_text.setText(state['shopping_list'])
+        else:
+            self.shopping_list()
+        self.update_stability()
+
+    def update_budget(self):
+        """ applies the budgets from the preferences """
+        self.budget = {'faces': self.preferences['max_faces'],
+                       'memory': self.preferences['max_memory_mb'] * 1e6,
+                       'time': self.preferences['max_time'],
+                       'hole_markers': self.preferences['max_hole_markers'],
+                       'hole_points': self.preferences['max_hole_points']}
+        if self.wall_shape is not None:
+            self.update_statistics()
+
+    def update_history_memory(self):
+        """ applies the memory limit of the undo history from the preferences """
+        self.history.memory = self.preferences['history_mb'] * 1e6
+
+    def undo(self):
+        if self.history.can_undo():
+            self._restore(*self.history.undo())
+
+    def redo(self):
+        if self.history.can_redo():
+            self._restore(*self.history.redo())
 
     def wall_to_str(self):
         out = ""
         out += "# Wall parameters\n\n"
         out += " - angle: " + str(round(self._wall["wall_angle"])) + " deg\n"
         out += " - gap: " + str(round(self._wall["gap"])) + " mm\n"
-        out += " - foot length: " + str(round(self._wall["safety"])) + " mm\n\n"
+        out += " - foot length: " + str(round(self._wall["safety"])) + " mm\n"
+        stability = tipping_check(self._wall, **self.settings)
+        if stability['min_safety'] is None:
+            out += " - minimum safe foot length: not reachable\n\n"
+        else:
+            out += " - minimum safe foot length: " + str(round(stability['min_safety'])) + " mm\n\n"
         out += " - width: " + str(round(self._wall["wall_width"])) + " mm\n"
         out += " - height: " + str(round(self._wall["wall_height"])) + " mm\n"
         area = self._wall["wall_height"]*self._wall["wall_width"]*1e-6
@@ -425,10 +965,36 @@ class BYOWApp(QtWidgets.QApplication):
         for part in self.wall_shape:
             if type(part) == Bar:
                 out += '##' + str(part)
+        out += "\n\n## Fasteners\n\n"
+        for fastener, count in sorted(fastener_schedule(self.wall_shape).items()):
+            out += " - " + fastener + ": " + str(count) + "\n"
         return out
 
     def shopping_list(self):
         self.window.shopping_list_text.setText(self.wall_to_str())
+        self.update_statistics()
+
+    def update_statistics(self):
+        """ shows the statistics of the exact shapes, as needed for the export """
+        stats = wall_statistics(self.wall_shape, exact=True)
+        out = "# Exact geometry\n\n" + statistics_to_str(stats)
+        for warning in check_budget(stats, self.budget):
+            out += "\n - " + warning
+        self.window.statistics_text.setText(out)
+
+    def update_stability(self):
+        """
+        shows the tipping margin in the status bar. This is cheap,
+        since no shapes are built, and can follow every dial movement
+        """
+        result = tipping_check(self._wall, **self.settings)
+        msg = "Tipping margin: " + str(round(result['margin'])) + " Nm"
+        msg += ", mass: " + str(round(result['mass'])) + " kg"
+        if result['min_safety'] is None:
+            msg += ", minimum safe foot length: not reachable"
+        else:
+            msg += ", minimum safe foot length: " + str(round(result['min_safety'])) + " mm"
+        self.window.statusBar().showMessage(msg)
 
     @property
     def wall(self):
@@ -449,6 +1015,7 @@ def gui():
     app = BYOWApp(sys.argv)
     app.viewer.trigger_redraw()
     app.shopping_list()
+    app.update_stability()
     app.run()
 
 
@@ -0,0 +1,112 @@
+from collections import deque
+from copy import deepcopy
+
+
+class WallHistory:
+    """
+    A bounded undo/redo history of wall parameters.
+
+    Each entry stores a snapshot of the wall dict together with the
+    state that has been computed from it (parts, bounding box, shopping
+    list, ...), so that stepping through recent designs needs no
+    recalculation. The entries live in a ring buffer of `size` entries.
+    The entries closest to the current one keep their computed state as
+    long as its estimated size fits into `memory` bytes, for all others
+    only the parameters are kept. The current entry always keeps its state.
+    """
+
+    def __init__(self, size=50, memory=500e6):
+        """
+        :param size: maximum number of parameter snapshots
+        :param memory: maximum total size in bytes of the computed states
+        """
+        self._entries = deque(maxlen=size)
+        self._cursor = -1
+        self._memory = memory
+
+    @property
+    def memory(self):
+        """ the maximum total size in bytes of the computed states """
+        return self._memory
+
+    @memory.setter
+    def memory(self, value):
+        self._memory = value
+        self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, wall, state=None, nbytes=0):
+        """
+        appends a new snapshot after the current one. All snapshots that
+        could have been restored by `redo` are dropped
+
+        :param wall: the wall dict. A deep copy is stored
+        :param state: a dict with the state computed from `wall` or None
+        :param nbytes: the estimated size of `state` in bytes
+        """
+        if 0 <= self._cursor < len(self._entries) and self._entries[self._cursor]['wall'] == wall:
+            self.store(state, nbytes)
+            return
+
+        while len(self._entries) > self._cursor + 1:
+            self._entries.pop()
+        # when the buffer is full, appending drops the oldest entry
+        if len(self._entries) < self._entries.maxlen:
+            self._cursor += 1
+        self._entries.append({'wall': deepcopy(wall), 'state': state, 'bytes': nbytes})
+        self._evict()
+
+    def store(self, state, nbytes=0):
+        """ attaches a computed state and its estimated size to the current snapshot """
+        self._entries[self._cursor]['state'] = state
+        self._entries[self._cursor]['bytes'] = nbytes
+        self._evict()
+
+    def can_undo(self):
+        return self._cursor > 0
+
+    def can_redo(self):
+        return self._cursor < len(self._entries) - 1
+
+    def undo(self):
+        """
+        steps back to the previous snapshot
+
+        :return: a tuple (wall, state) with a copy of the wall dict and
+                 the computed state or None if it has been evicted
+        """
+        if not self.can_undo():
+            raise IndexError("nothing to undo")
+        self._cursor -= 1
+        return self.current()
+
+    def redo(self):
+        """
+        steps forward to the next snapshot
+
+        :return: a tuple (wall, state) like `undo`
+        """
+        if not self.can_redo():
+            raise IndexError("nothing to redo")
+        self._cursor += 1
+        return self.current()
+
+    def current(self):
+        """ returns the current snapshot as a tuple (wall, state) """
+        entry = self._entries[self._cursor]
+        return deepcopy(entry['wall']), entry['state']
+
+    def _evict(self):
+        """ drops the computed state of the snapshots farthest from the current one """
+        order = sorted(range(len(self._entries)), key=lambda i: abs(i - self._cursor))
+        total = 0
+        for i in order:
+            entry = self._entries[i]
+            if entry['state'] is None:
+                continue
+            total += entry['bytes']
+            if total > self._memory and i != self._cursor:
+                entry['state'] = None
+                entry['bytes'] = 0
@@ -0,0 +1,259 @@
+"""
+Joint detection and fastener schedule.
+
+Touching parts are found with a uniform grid over the axis-aligned
+bounds of the placed parts and an exact separating axis test of the
+candidate pairs. Every part is a convex prism, its side profile in the
+local xz-plane extruded along the local y-axis, so miter cuts are
+taken into account. No shapes are built, so this is cheap enough to
+run on every recalculation and across parameter sweeps.
+"""
+
+from math import ceil, floor
+
+from OCC.Core.gp import gp_Pnt
+
+from byow.parts import Bar, Panel
+
+# edge length of the grid cells of the contact index in mm
+CELL_SIZE = 500.
+
+# parts closer than this are considered to be touching, in mm
+CONTACT_TOLERANCE = 1.
+
+# bars are bolted with two bolts per joint, panels are screwed to
+# the bars every SCREW_SPACING mm along the contact
+BOLT = 'carriage bolt M10'
+SCREW = 'wood screw 5 mm'
+SCREW_SPACING = 250.
+SCREW_DEPTH = 30.
+
+
+def _sub(a, b):
+    return a[0] - b[0], a[1] - b[1], a[2] - b[2]
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0])
+
+
+def _normalized(v):
+    length = _dot(v, v) ** 0.5
+    return v[0] / length, v[1] / length, v[2] / length
+
+
+def _interval(vertices, n):
+    """ returns the projection of a list of points onto a direction as (min, max) """
+    d = [_dot(p, n) for p in vertices]
+    return min(d), max(d)
+
+
+def convex_prism(part):
+    """
+    returns the convex prism of a placed part in global coordinates
+
+    :param part: a Bar or Panel instance
+
+    :return: a dict with the 'vertices', the face 'normals', the edge
+             'directions' and the local 'axes' of the part
+    """
+    o = gp_Pnt(0., 0., 0.).Transformed(part._trsf)
+    origin = (o.X(), o.Y(), o.Z())
+    axes = []
+    for x, y, z in ((1., 0., 0.), (0., 1., 0.), (0., 0., 1.)):
+        p = gp_Pnt(x, y, z).Transformed(part._trsf)
+        axes.append(_sub((p.X(), p.Y(), p.Z()), origin))
+
+    def vector(x, y, z):
+        return tuple(x * axes[0][k] + y * axes[1][k] + z * axes[2][k] for k in range(3))
+
+    if isinstance(part, Bar):
+        profile, depth = part._profile(), part._section[0]
+    else:
+        dx, depth, dz = part._extent()
+        profile = [(0., 0.), (dx, 0.), (dx, dz), (0., dz)]
+
+    vertices = [tuple(origin[k] + c for k, c in enumerate(vector(u, y, v)))
+                for y in (0., depth) for u, v in profile]
+    normals = [axes[1]]
+    directions = [axes[1]]
+    for i in range(len(profile)):
+        u0, v0 = profile[i]
+        u1, v1 = profile[(i + 1) % len(profile)]
+        if abs(u1 - u0) + abs(v1 - v0) < 1e-9:
+            continue
+        directions.append(_normalized(vector(u1 - u0, 0., v1 - v0)))
+        normals.append(_normalized(vector(v1 - v0, 0., u0 - u1)))
+    return {'vertices': vertices, 'normals': normals, 'directions': directions, 'axes': axes}
+
+
+def _contact_normal(prism_a, prism_b, tol):
+    """
+    separating axis test of two convex prisms
+
+    :return: None if the prisms are further apart than tol, otherwise
+             the face normal along which they overlap least
+    """
+    best = None
+    for n in prism_a['normals'] + prism_b['normals']:
+        lo_a, hi_a = _interval(prism_a['vertices'], n)
+        lo_b, hi_b = _interval(prism_b['vertices'], n)
+        overlap = min(hi_a, hi_b) - max(lo_a, lo_b)
+        if overlap < -tol:
+            return None
+        if best is None or overlap < best[0]:
+            best = (overlap, n)
+    for u in prism_a['directions']:
+        for v in prism_b['directions']:
+            n = _cross(u, v)
+            if _dot(n, n) < 1e-12:
+                continue
+            n = _normalized(n)
+            lo_a, hi_a = _interval(prism_a['vertices'], n)
+            lo_b, hi_b = _interval(prism_b['vertices'], n)
+            if min(hi_a, hi_b) - max(lo_a, lo_b) < -tol:
+                return None
+    return best[1]
+
+
+def contacts(parts, cell_size=CELL_SIZE, tol=CONTACT_TOLERANCE):
+    """
+    finds all pairs of touching or overlapping parts
+
+    :param parts: a list of Part instances
+    :param cell_size: the edge length of the grid cells of the contact index
+    :param tol: the contact tolerance in mm
+
+    :return: a list of index pairs (i, j) with i < j
+    """
+    prisms = [convex_prism(part) for part in parts]
+
+    # contact index: every part is entered into all cells its bounds touch
+    grid = {}
+    for i, prism in enumerate(prisms):
+        vertices = prism['vertices']
+        lo = [floor((min(p[k] for p in vertices) - tol) / cell_size) for k in range(3)]
+        hi = [floor((max(p[k] for p in vertices) + tol) / cell_size) for k in range(3)]
+        for x in range(lo[0], hi[0] + 1):
+            for y in range(lo[1], hi[1] + 1):
+                for z in range(lo[2], hi[2] + 1):
+                    grid.setdefault((x, y, z), []).append(i)
+
+    candidates = set()
+    for cell in grid.values():
+        for a in range(len(cell)):
+            for b in range(a + 1, len(cell)):
+                candidates.add((cell[a], cell[b]))
+
+    return sorted(pair for pair in candidates
+                  if _contact_normal(prisms[pair[0]], prisms[pair[1]], tol) is not None)
+
+
+def _thickness(bar, prism, normal):
+    """
+    returns the extent of a bar along a direction. A bolt through the
+    end grain of a butt joint does not go through the whole bar, so the
+    thickness is at most the larger side of the section
+    """
+    lo, hi = _interval(prism['vertices'], normal)
+    return min(max(bar._section), hi - lo)
+
+
+def joint(part_a, part_b, tol=CONTACT_TOLERANCE):
+    """
+    returns the fasteners of the joint between two touching parts. Panels
+    are screwed through their face to bars, bars are bolted to each other.
+    Panels are not fastened through their edges
+
+    :param part_a: a Part instance
+    :param part_b: a Part instance touching part_a
+    :param tol: the contact tolerance in mm
+
+    :return: None if the joint is not fastened, otherwise a dict with
+             the part names, the fastener description, its count and the
+             fastener positions in global coordinates
+    """
+    if isinstance(part_b, Panel) and not isinstance(part_a, Panel):
+        part_a, part_b = part_b, part_a
+    prism_a = convex_prism(part_a)
+    prism_b = convex_prism(part_b)
+    n = _contact_normal(prism_a, prism_b, tol)
+    if n is None:
+        return None
+
+    # the contact plane lies in the middle of the overlap along the normal
+    lo_a, hi_a = _interval(prism_a['vertices'], n)
+    lo_b, hi_b = _interval(prism_b['vertices'], n)
+    depth = (max(lo_a, lo_b) + min(hi_a, hi_b)) / 2.
+
+    # the contact patch is the overlap of both parts along two directions in that plane
+    u = min(prism_a['axes'] + prism_b['axes'], key=lambda axis: abs(_dot(axis, n)))
+    u = _normalized(_sub(u, tuple(_dot(u, n) * c for c in n)))
+    v = _cross(n, u)
+    patch = []
+    for w in (u, v):
+        lo_a, hi_a = _interval(prism_a['vertices'], w)
+        lo_b, hi_b = _interval(prism_b['vertices'], w)
+        patch.append((w, max(lo_a, lo_b), min(hi_a, hi_b)))
+    patch.sort(key=lambda p: p[2] - p[1])
+    (across, a0, a1), (along, l0, l1) = patch
+    length = max(0., l1 - l0)
+
+    if isinstance(part_a, Panel):
+        if isinstance(part_b, Panel) or abs(_dot(n, prism_a['axes'][2])) < 0.99:
+            return None
+        fastener = SCREW
+        count = floor(length / SCREW_SPACING) + 1
+        fastener_length = part_a._thickness + SCREW_DEPTH
+    else:
+        fastener = BOLT
+        count = 2
+        fastener_length = _thickness(part_a, prism_a, n) + _thickness(part_b, prism_b, n)
+    fastener += ' x ' + str(int(ceil(fastener_length / 10.) * 10)) + ' mm'
+
+    positions = []
+    for i in range(count):
+        s = l0 + (i + 0.5) * length / count
+        t = (a0 + a1) / 2.
+        positions.append(tuple(depth * n[k] + s * along[k] + t * across[k] for k in range(3)))
+
+    return {'parts': (part_a.name, part_b.name),
+            'fastener': fastener,
+            'count': count,
+            'positions': positions}
+
+
+def joints(parts):
+    """
+    detects all fastened joints of a wall
+
+    :param parts: a list of Part instances
+
+    :return: a list of dicts as returned by `joint`
+    """
+    out = []
+    for i, j in contacts(parts):
+        fastened = joint(parts[i], parts[j])
+        if fastened is not None:
+            out.append(fastened)
+    return out
+
+
+def fastener_schedule(parts):
+    """
+    returns the total number of each fastener of a wall
+
+    :param parts: a list of Part instances
+
+    :return: a dict mapping the fastener descriptions to their counts
+    """
+    out = {}
+    for j in joints(parts):
+        out[j['fastener']] = out.get(j['fastener'], 0) + j['count']
+    return out
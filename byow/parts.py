@@ -1,14 +1,148 @@
 
-from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox, BRepPrimAPI_MakeHalfSpace
-from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Cut
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform, BRepBuilderAPI_MakeFace
+from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox, BRepPrimAPI_MakePrism
+from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Fuse
+from OCC.Core.BRepBuilderAPI import (BRepBuilderAPI_Transform, BRepBuilderAPI_MakeFace,
+                                     BRepBuilderAPI_MakeEdge, BRepBuilderAPI_MakePolygon)
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.TopoDS import TopoDS_Compound
 from OCC.Core.BRepFeat import BRepFeat_MakeCylindricalHole
-from OCC.Core.gp import gp_Ax1, gp_Pnt, gp_Dir, gp_Trsf, gp_Vec, gp_Pln
+from OCC.Core.BOPAlgo import BOPAlgo_GlueShift
+from OCC.Core.ShapeUpgrade import ShapeUpgrade_UnifySameDomain
+from OCC.Core.TopTools import TopTools_ListOfShape
+from OCC.Core.gp import gp_Ax1, gp_Ax2, gp_Pnt, gp_Dir, gp_Trsf, gp_Vec, gp_Circ
 
 from abc import ABC, abstractmethod
-from math import radians, sin, cos, floor
+from collections import OrderedDict
+from math import radians, sin, cos, floor, pi
+from time import perf_counter
+import multiprocessing
 
-from byow.util import euler_to_gp_trsf
+from byow.util import euler_to_gp_trsf, shape_to_string, shape_from_string
+
+
+# volume and local center of gravity of every unique part geometry,
+# keyed by the part type and its geometry key
+_mass_properties_cache = OrderedDict()
+MASS_PROPERTIES_CACHE_SIZE = 1024
+
+# unplaced shapes of the most recently used part geometries. Parts with
+# the same geometry share one shape and only differ by their location
+_shape_cache = OrderedDict()
+SHAPE_CACHE_SIZE = 64
+
+# hole markers are drawn this far in front of the climbing side of a
+# panel, its local z=0 face, so that they do not fight with the face
+MARKER_OFFSET = 0.5
+
+
+def _cached(cache, size, key, compute):
+    """
+    returns cache[key] and computes it if it is missing. The
+    least recently used entries are dropped beyond `size` entries
+
+    :param cache: an OrderedDict
+    :param size: the maximum number of entries
+    :param key: the key to look up
+    :param compute: a function without arguments that computes the value
+
+    :return: the cached value
+    """
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache[key] = value
+        if len(cache) > size:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return value
+
+
+def _polygon_area_centroid(points):
+    """
+    returns the area and centroid of a simple 2D polygon
+
+    :param points: a list of (u, v) tuples, the polygon vertices in order
+
+    :return: a tuple (area, (u, v)) with the centroid (u, v)
+    """
+    a = cu = cv = 0.
+    for i in range(len(points)):
+        u0, v0 = points[i]
+        u1, v1 = points[(i + 1) % len(points)]
+        cross = u0 * v1 - u1 * v0
+        a += cross
+        cu += (u0 + u1) * cross
+        cv += (v0 + v1) * cross
+    a /= 2.
+    return abs(a), (cu / (6. * a), cv / (6. * a))
+
+
+def _lattice_cells(coords, dist, length):
+    """
+    groups the hole coordinates along one axis by the width of their
+    lattice cell. The cells are centered at the holes and clipped to
+    the panel
+
+    :param coords: the hole coordinates along the axis
+    :param dist: the hole spacing along the axis
+    :param length: the panel length along the axis
+
+    :return: a dict mapping the cell widths to tuples (count, sum of coords)
+    """
+    out = {}
+    for c in coords:
+        width = max(0., min(c + dist / 2., length) - max(c - dist / 2., 0.))
+        n, total = out.get(width, (0, 0.))
+        out[width] = (n + 1, total + c)
+    return out
+
+
+def _drill(shape, xs, ys, radius):
+    """
+    drills a lattice of cylindrical holes through a shape along the z-axis
+
+    :param shape: the shape to drill
+    :param xs: the x coordinates of the hole lattice
+    :param ys: the y coordinates of the hole lattice
+    :param radius: the hole radius
+
+    :return: the drilled shape
+    """
+    for x in xs:
+        for y in ys:
+            feature_origin = gp_Ax1(gp_Pnt(x, y, 0), gp_Dir(0, 0, 1))
+            feature_maker = BRepFeat_MakeCylindricalHole()
+            feature_maker.Init(shape, feature_origin)
+            feature_maker.Build()
+            feature_maker.Perform(radius)
+            shape = feature_maker.Shape()
+    return shape
+
+
+def _drill_tile(x0, x1, y0, y1, thickness, xs, ys, radius):
+    """
+    creates and drills one tile of a panel. This runs in a worker
+    process, so the tile is returned as a BRep string
+    """
+    tile = BRepPrimAPI_MakeBox(gp_Pnt(x0, y0, 0), x1 - x0, y1 - y0, thickness).Shape()
+    return shape_to_string(_drill(tile, xs, ys, radius))
+
+
+def _tile_bounds(coords, n, length):
+    """
+    splits a sorted list of hole coordinates into chunks of at most n
+    holes. The chunk boundaries lie halfway between neighboring holes
+
+    :return: a list of tuples (start, end, coords)
+    """
+    out = []
+    for i in range(0, len(coords), n):
+        chunk = coords[i:i + n]
+        start = 0. if i == 0 else (coords[i - 1] + coords[i]) / 2.
+        end = length if i + n >= len(coords) else (coords[i + n - 1] + coords[i + n]) / 2.
+        out.append((start, end, chunk))
+    return out
 
 
 class Part(ABC):
@@ -40,7 +174,11 @@ class Part(ABC):
         self._orientation = ori
         self._parent = parent
 
-        self._set_shape()
+        self._shape = None
+        self._light_shape = None
+        self._hole_markers = None
+        self._trsf = None
+        self.build_time = None
         self._place()
 
         self.name = ''
@@ -56,16 +194,55 @@ class Part(ABC):
         """
         pass
 
-    def _place(self):
+    @abstractmethod
+    def _geometry_key(self):
+        """
+        returns a hashable tuple of all parameters that determine
+        the shape of the part in its local coordinate system.
+        Two parts with equal geometry keys have the same shape.
+        This must be implemented by the derived classes
+        """
+        pass
+
+    @abstractmethod
+    def _extent(self):
+        """
+        returns the dimensions (dx, dy, dz) of the box that
+        encloses the part in its local coordinate system. The box
+        starts at the local origin. This must be implemented by
+        the derived classes
+        """
+        pass
+
+    @abstractmethod
+    def _topology(self, exact=True):
+        """
+        returns the expected number of faces, edges and vertices and
+        the number of through holes of the shape as a dict, without
+        building it. This must be implemented by the derived classes
+
+        :param exact: If True, count the exact shape, otherwise the light shape
+        """
+        pass
+
+    @abstractmethod
+    def _mass_properties(self):
         """
-        put the part where it belongs. This should be called
-        after the shape has been initialized, so that the
-        shape can be transformed
+        returns the volume in mm^3 and the center of gravity in local
+        coordinates as a tuple (volume, (x, y, z)). This must be
+        implemented by the derived classes without building the shape
         """
-        assert (self._shape is not None)
+        pass
 
+    def _place(self):
+        """
+        put the part where it belongs. This computes the
+        transformation of the part from its position, orientation
+        and parent. The shape is built and transformed lazily when
+        it is first accessed
+        """
         if self._parent is not None:
-            trans = self._parent.shape.Location().Transformation()
+            trans = self._parent.transformation
         else:
             trans = gp_Trsf()
 
@@ -76,9 +253,50 @@ class Part(ABC):
         rot = euler_to_gp_trsf(self._orientation)
         trans = trans * rot
 
-        brep_trns = BRepBuilderAPI_Transform(self._shape, trans, False)
-        brep_trns.Build()
-        self._shape = brep_trns.Shape()
+        self._trsf = trans
+        self._shape = None
+        self._light_shape = None
+        self._hole_markers = None
+
+    def local_mass_properties(self):
+        """
+        returns the volume in mm^3 and the center of gravity in local
+        coordinates as a tuple (volume, (x, y, z)). The values are
+        computed once per unique geometry and cached
+        """
+        key = (type(self).__name__, self._geometry_key())
+        return _cached(_mass_properties_cache, MASS_PROPERTIES_CACHE_SIZE, key, self._mass_properties)
+
+    @property
+    def volume(self):
+        """ returns the volume of the part in mm^3 """
+        return self.local_mass_properties()[0]
+
+    def mass(self, density):
+        """
+        returns the mass of the part in kg
+
+        :param density: the density of the material in kg/m^3
+        """
+        return self.volume * density * 1e-9
+
+    @property
+    def center_of_gravity(self):
+        """ returns the center of gravity in global coordinates as (x, y, z) """
+        cog = gp_Pnt(*self.local_mass_properties()[1]).Transformed(self._trsf)
+        return cog.X(), cog.Y(), cog.Z()
+
+    @property
+    def corners(self):
+        """ returns the 8 corners of the part's oriented box in global coordinates """
+        dx, dy, dz = self._extent()
+        out = []
+        for x in (0., dx):
+            for y in (0., dy):
+                for z in (0., dz):
+                    p = gp_Pnt(x, y, z).Transformed(self._trsf)
+                    out.append((p.X(), p.Y(), p.Z()))
+        return out
 
     @property
     def position(self):
@@ -98,11 +316,43 @@ class Part(ABC):
         self._orientation = value
         self._place()
 
+    @property
+    def transformation(self):
+        """ returns the gp_Trsf that places the part """
+        return self._trsf
+
+    def _located(self, shape):
+        """ returns a shape in local coordinates moved to the part's placement """
+        brep_trns = BRepBuilderAPI_Transform(shape, self._trsf, False)
+        brep_trns.Build()
+        return brep_trns.Shape()
+
+    def _build_shape(self):
+        """ builds and returns the unplaced shape """
+        self._set_shape()
+        return self._shape
+
     @property
     def shape(self):
-        """ returns the shape """
+        """
+        returns the exact shape, building it on first access. Parts with
+        equal geometry keys share the same underlying shape
+        """
+        if self._shape is None:
+            start = perf_counter()
+            key = (type(self).__name__, self._geometry_key())
+            self._shape = self._located(_cached(_shape_cache, SHAPE_CACHE_SIZE, key, self._build_shape))
+            self.build_time = perf_counter() - start
         return self._shape
 
+    @property
+    def light_shape(self):
+        """
+        returns a cheap representation of the shape for viewing and
+        bounding boxes. By default, this is the exact shape
+        """
+        return self.shape
+
     @property
     def parent(self):
         """ returns the parent """
@@ -127,44 +377,57 @@ class Bar(Part):
         super().__init__(pos, ori, parent)
 
     def _set_shape(self):
-        self._shape = BRepPrimAPI_MakeBox(self._length,
-                                          self._section[0],
-                                          self._section[1]).Shape()
-
-        if self._saw_start is not None:
-            if -90+1e-6 < self._saw_start < 90-1e-6:
-                ra = radians(self._saw_start)
-                sina = sin(ra)
-                cosa = cos(ra)
-                if ra > 0:
-                    pnt = gp_Pnt(0, 0, 0)
-                    pln = gp_Pln(pnt, gp_Dir(-sina, 0, cosa))
-                    pnt_out = gp_Pnt(0, 0, self._section[1])
-                else:
-                    pnt = gp_Pnt(0, 0, self._section[1])
-                    pln = gp_Pln(pnt, gp_Dir(sina, 0, -cosa))
-                    pnt_out = gp_Pnt(0, 0, 0)
-                face = BRepBuilderAPI_MakeFace(pln).Shape()
-                tool = BRepPrimAPI_MakeHalfSpace(face, pnt_out).Solid()
-                self._shape = BRepAlgoAPI_Cut(self._shape, tool).Shape()
-
-        if self._saw_end is not None:
-            if -90 + 1e-6 < self._saw_end < 90-1e-6:
-                ra = radians(self._saw_end)
-                sina = sin(ra)
-                cosa = cos(ra)
-                if ra > 0:
-                    pnt = gp_Pnt(self._length, 0, 0)
-                    pln = gp_Pln(pnt, gp_Dir(sina, 0, cosa))
-                    pnt_out = gp_Pnt(self._length, 0, self._section[1])
-                else:
-                    pnt = gp_Pnt(self._length, 0, self._section[1])
-                    pln = gp_Pln(pnt, gp_Dir(-sina, 0, -cosa))
-                    pnt_out = gp_Pnt(self._length, 0, 0)
-
-                face = BRepBuilderAPI_MakeFace(pln).Shape()
-                tool = BRepPrimAPI_MakeHalfSpace(face, pnt_out).Solid()
-                self._shape = BRepAlgoAPI_Cut(self._shape, tool).Shape()
+        # the (mitered) bar is its side profile extruded along the local y-axis
+        polygon = BRepBuilderAPI_MakePolygon()
+        for x, z in self._profile():
+            polygon.Add(gp_Pnt(x, 0, z))
+        polygon.Close()
+        face = BRepBuilderAPI_MakeFace(polygon.Wire()).Face()
+        self._shape = BRepPrimAPI_MakePrism(face, gp_Vec(0, self._section[0], 0)).Shape()
+
+    def _geometry_key(self):
+        return (self._length, tuple(self._section), self._saw_start, self._saw_end)
+
+    def _extent(self):
+        return self._length, self._section[0], self._section[1]
+
+    def _miter_offsets(self, angle):
+        """
+        returns how far the bottom and the top edge of the profile
+        are shortened by a miter cut with the given saw angle
+
+        :param angle: the saw angle in degrees or None
+
+        :return: a tuple (bottom, top) of offsets along the bar
+        """
+        if angle is None or not -90 + 1e-6 < angle < 90 - 1e-6:
+            return 0., 0.
+        ra = radians(angle)
+        offset = abs(self._section[1] * cos(ra) / sin(ra))
+        if ra > 0:
+            return 0., offset
+        return offset, 0.
+
+    def _profile(self):
+        """
+        returns the side profile of the bar in the local xz-plane as
+        a list of (x, z) points. The bar is this profile extruded
+        along the local y-axis by the first section dimension
+        """
+        bottom_start, top_start = self._miter_offsets(self._saw_start)
+        bottom_end, top_end = self._miter_offsets(self._saw_end)
+        return [(bottom_start, 0.),
+                (self._length - bottom_end, 0.),
+                (self._length - top_end, self._section[1]),
+                (top_start, self._section[1])]
+
+    def _topology(self, exact=True):
+        n = len(self._profile())
+        return {'faces': n + 2, 'edges': 3 * n, 'vertices': 2 * n, 'holes': 0}
+
+    def _mass_properties(self):
+        area, (x, z) = _polygon_area_centroid(self._profile())
+        return area * self._section[0], (x, self._section[0] / 2., z)
 
     def __repr__(self):
         out = '# ' + self.name + '\n'
@@ -182,6 +445,16 @@ class Bar(Part):
 
 class Panel(Part):
 
+    # panels with more holes than this are drilled in tiles in parallel
+    tile_threshold = 400
+    # the maximum number of holes per tile. This bounds the memory per worker
+    tile_size = 100
+    # the number of worker processes for tiled drilling, None for all cores
+    tile_workers = None
+    # whether tiled drilling may start worker processes. Processes that are
+    # workers of a pool themselves must switch this off, see byow.service
+    tiling = True
+
     def __init__(self,
                  pos=None,
                  ori=None,
@@ -219,18 +492,142 @@ class Panel(Part):
         out += '\n'
         return out
 
-    def _set_shape(self):
-        self._shape = BRepPrimAPI_MakeBox(self._height, self._width, self._thickness).Shape()
+    def _geometry_key(self):
+        holes = tuple(sorted(self._holes.items()))
+        return (self._width, self._height, self._thickness, holes)
+
+    def _extent(self):
+        return self._height, self._width, self._thickness
+
+    def _hole_grid(self):
+        """
+        returns the local x and y coordinates of the hole lattice
+        as a tuple of two lists
+        """
+        xs = []
         x = self._holes['x_start']
-        y = self._holes['y_start']
         while x < self._height:
-            while y < self._width:
-                feature_origin = gp_Ax1(gp_Pnt(x, y, 0), gp_Dir(0, 0, 1))
-                feature_maker = BRepFeat_MakeCylindricalHole()
-                feature_maker.Init(self._shape, feature_origin)
-                feature_maker.Build()
-                feature_maker.Perform(self._holes['diameter'] / 2.0)
-                self._shape = feature_maker.Shape()
-                y += self._holes['y_dist']
+            xs.append(x)
             x += self._holes['x_dist']
-            y = self._holes['y_start']
+        ys = []
+        y = self._holes['y_start']
+        while y < self._width:
+            ys.append(y)
+            y += self._holes['y_dist']
+        return xs, ys
+
+    @property
+    def light_shape(self):
+        """
+        returns the undrilled panel. The holes are only kept as
+        parameters, see `hole_markers`, and are cut when the exact
+        shape is requested
+        """
+        if self._light_shape is None:
+            box = BRepPrimAPI_MakeBox(self._height, self._width, self._thickness).Shape()
+            self._light_shape = self._located(box)
+        return self._light_shape
+
+    def _build_hole_markers(self):
+        """ builds and returns the unplaced hole markers """
+        compound = TopoDS_Compound()
+        builder = BRep_Builder()
+        builder.MakeCompound(compound)
+        xs, ys = self._hole_grid()
+        radius = self._holes['diameter'] / 2.0
+        for x in xs:
+            for y in ys:
+                circle = gp_Circ(gp_Ax2(gp_Pnt(x, y, -MARKER_OFFSET), gp_Dir(0, 0, 1)), radius)
+                builder.Add(compound, BRepBuilderAPI_MakeEdge(circle).Edge())
+        return compound
+
+    @property
+    def hole_markers(self):
+        """
+        returns a compound of the hole rims as circular edges on the
+        climbing side of the panel, slightly in front of it. This is much
+        cheaper to display than the faces of the drilled holes. Panels with
+        equal geometry share the compound
+        """
+        if self._hole_markers is None:
+            key = ('hole markers', self._geometry_key())
+            self._hole_markers = self._located(
+                _cached(_shape_cache, SHAPE_CACHE_SIZE, key, self._build_hole_markers))
+        return self._hole_markers
+
+    def hole_centers(self):
+        """
+        returns the centers of the holes on the climbing side of the panel,
+        slightly in front of it, in local coordinates as a list of (x, y, z)
+        tuples. They only depend on the geometry key and are placed with
+        `transformation`
+        """
+        xs, ys = self._hole_grid()
+        return [(x, y, -MARKER_OFFSET) for x in xs for y in ys]
+
+    def _topology(self, exact=True):
+        # every hole adds a cylindrical face bounded by two circles and a seam edge
+        xs, ys = self._hole_grid()
+        n = len(xs) * len(ys) if exact else 0
+        return {'faces': 6 + n, 'edges': 12 + 3 * n, 'vertices': 8 + 2 * n,
+                'holes': len(xs) * len(ys)}
+
+    def _mass_properties(self):
+        # holes can overlap, so every hole removes at most its lattice cell
+        xs, ys = self._hole_grid()
+        cells_x = _lattice_cells(xs, self._holes['x_dist'], self._height)
+        cells_y = _lattice_cells(ys, self._holes['y_dist'], self._width)
+        hole_area = pi * (self._holes['diameter'] / 2.) ** 2
+        box_volume = self._height * self._width * self._thickness
+        removed = removed_x = removed_y = 0.
+        for wx, (nx, sx) in cells_x.items():
+            for wy, (ny, sy) in cells_y.items():
+                hole_volume = min(hole_area, wx * wy) * self._thickness
+                removed += hole_volume * nx * ny
+                removed_x += hole_volume * sx * ny
+                removed_y += hole_volume * nx * sy
+        volume = box_volume - removed
+        if volume <= 1e-9 * box_volume:
+            return 0., (self._height / 2., self._width / 2., self._thickness / 2.)
+        x = (box_volume * self._height / 2. - removed_x) / volume
+        y = (box_volume * self._width / 2. - removed_y) / volume
+        return volume, (x, y, self._thickness / 2.)
+
+    def _set_shape(self):
+        xs, ys = self._hole_grid()
+        radius = self._holes['diameter'] / 2.0
+
+        # tiles are cut halfway between holes, so holes must not overlap
+        tiled = (self.tiling
+                 and len(xs) * len(ys) > self.tile_threshold
+                 and 2 * radius < min(self._holes['x_dist'], self._holes['y_dist']))
+
+        if not tiled:
+            self._shape = BRepPrimAPI_MakeBox(self._height, self._width, self._thickness).Shape()
+            self._shape = _drill(self._shape, xs, ys, radius)
+            return
+
+        cols = min(len(ys), self.tile_size)
+        rows = max(1, self.tile_size // cols)
+        # spawned workers do not inherit the state of a GUI or service process
+        tasks = [(x0, x1, y0, y1, self._thickness, tile_xs, tile_ys, radius)
+                 for x0, x1, tile_xs in _tile_bounds(xs, rows, self._height)
+                 for y0, y1, tile_ys in _tile_bounds(ys, cols, self._width)]
+        with multiprocessing.get_context('spawn').Pool(self.tile_workers) as pool:
+            tiles = [shape_from_string(tile) for tile in pool.starmap(_drill_tile, tasks)]
+
+        # glue the tiles to one solid and merge the faces split at the tile borders
+        arguments = TopTools_ListOfShape()
+        arguments.Append(tiles[0])
+        tools = TopTools_ListOfShape()
+        for tile in tiles[1:]:
+            tools.Append(tile)
+        fuse = BRepAlgoAPI_Fuse()
+        fuse.SetArguments(arguments)
+        fuse.SetTools(tools)
+        fuse.SetGlue(BOPAlgo_GlueShift)
+        fuse.SetRunParallel(True)
+        fuse.Build()
+        unify = ShapeUpgrade_UnifySameDomain(fuse.Shape(), True, True, False)
+        unify.Build()
+        self._shape = unify.Shape()
@@ -0,0 +1,349 @@
+"""
+A small local HTTP service around `climbing_wall`.
+
+POST a JSON object with the keyword arguments of `climbing_wall` to
+`/wall` and get the bill of materials and the bounding box as JSON.
+With `/wall?format=step` or `/wall?format=stl` the response is the
+STEP file or a STL mesh of the wall instead. `GET /stats` reports
+the cache and coalescing counters.
+
+The geometry is built in a pool of worker processes. Identical requests
+that arrive while a wall is being built wait for the same result, and
+finished results are kept in a bounded cache.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+from byow.climbing_wall import climbing_wall
+from byow.parts import Panel
+from byow.util import make_compound, get_boundingbox, export_to_step, export_to_stl
+from byow.joints import joints
+from byow.statistics import wall_statistics, check_budget, DEFAULT_BUDGET
+
+FORMATS = {'json': 'application/json',
+           'step': 'application/step',
+           'stl': 'model/stl'}
+
+# accepted ranges of the wall parameters in mm and degrees, as in the GUI
+WALL_RANGES = {'wall_width': (200, 8000),
+               'wall_height': (200, 8000),
+               'wall_thickness': (2, 100),
+               'wall_angle': (0, 85),
+               'gap': (0, 2000),
+               'safety': (0, 8000),
+               'max_span': (200, 8000),
+               'max_panel_width': (200, 8000),
+               'max_panel_height': (200, 8000)}
+HOLE_RANGES = {'diameter': (1, 50),
+               'x_start': (1, 1000),
+               'y_start': (1, 1000),
+               'x_dist': (1, 1000),
+               'y_dist': (1, 1000)}
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _check_range(name, value, limits):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return name + ' must be a number'
+    if not limits[0] <= value <= limits[1]:
+        return name + ' must be between ' + str(limits[0]) + ' and ' + str(limits[1])
+    return None
+
+
+def validate(wall):
+    """
+    checks the names, types and ranges of wall parameters
+
+    :param wall: the decoded JSON request body
+
+    :return: an error message or None if the parameters are valid
+    """
+    if not isinstance(wall, dict):
+        return 'expected a JSON object'
+    for key, value in sorted(wall.items()):
+        if key == 'holes':
+            if not isinstance(value, dict) or set(value) != set(HOLE_RANGES):
+                return 'holes must be an object with ' + ', '.join(sorted(HOLE_RANGES))
+            for name, v in sorted(value.items()):
+                error = _check_range('holes.' + name, v, HOLE_RANGES[name])
+                if error is not None:
+                    return error
+        elif key in WALL_RANGES:
+            error = _check_range(key, value, WALL_RANGES[key])
+            if error is not None:
+                return error
+        else:
+            return 'unknown wall parameter: ' + key
+    return None
+
+
+def build(wall, fmt='json'):
+    """
+    builds a wall and returns the requested output. This runs
+    in the worker processes
+
+    :param wall: a dict with keyword arguments of `climbing_wall`
+    :param fmt: one of 'json', 'step' or 'stl'
+
+    :return: the response body as bytes
+    """
+    parts = climbing_wall(**wall)
+
+    if fmt == 'json':
+        bb = get_boundingbox(make_compound(parts, exact=False), use_mesh=False)
+        out = {'bounding_box': bb,
+               'parts': [{'name': part.name,
+                          'type': type(part).__name__,
+                          'description': str(part)} for part in parts],
+               'joints': joints(parts)}
+        return json.dumps(out).encode('utf-8')
+
+    export = export_to_step if fmt == 'step' else export_to_stl
+    fd, filename = tempfile.mkstemp(suffix='.' + fmt)
+    os.close(fd)
+    try:
+        export(filename, parts)
+        with open(filename, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(filename)
+
+
+def _build_in_worker(wall, fmt):
+    """
+    runs `build` in a worker process. Every worker already keeps one core
+    busy, so panels are drilled without starting further processes
+    """
+    Panel.tiling = False
+    return build(wall, fmt)
+
+
+class WallService:
+    """
+    Builds walls in a process pool, coalesces identical requests
+    and caches the most recent results
+    """
+
+    def __init__(self, workers=None, cache_bytes=256e6, budget=None):
+        """
+        :param workers: number of worker processes, default is the number of cores
+        :param cache_bytes: maximum total size of the cached results in bytes
+        :param budget: the budget for STEP and STL requests, see `check_budget`
+        """
+        self.budget = DEFAULT_BUDGET if budget is None else budget
+        self._workers = workers
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._cache = OrderedDict()
+        self._cache_bytes = cache_bytes
+        self._cached_bytes = 0
+        self._pending = {}
+        self._lock = threading.RLock()
+        self.stats = {'requests': 0, 'hits': 0, 'coalesced': 0, 'builds': 0, 'restarts': 0}
+
+    def get(self, wall, fmt='json'):
+        """
+        returns the output of `build` for a wall, from the cache if possible
+
+        :param wall: a dict with keyword arguments of `climbing_wall`
+        :param fmt: one of 'json', 'step' or 'stl'
+
+        :return: the response body as bytes
+        :raises BudgetExceeded: if a STEP or STL wall exceeds the budget
+        """
+        key = (json.dumps(wall, sort_keys=True), fmt)
+        with self._lock:
+            self.stats['requests'] += 1
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            future = self._pending.get(key)
+
+        # refuse exact geometry that would exceed the budget. Cached and
+        # pending results have already passed this check
+        if future is None and fmt != 'json':
+            warnings = check_budget(wall_statistics(climbing_wall(**wall)), self.budget)
+            if warnings:
+                raise BudgetExceeded('; '.join(warnings))
+
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            future = self._pending.get(key)
+            if future is None:
+                self.stats['builds'] += 1
+                pool = self._pool
+                try:
+                    future = pool.submit(_build_in_worker, wall, fmt)
+                except BrokenProcessPool:
+                    pool = self._restart(pool)
+                    future = pool.submit(_build_in_worker, wall, fmt)
+                self._pending[key] = future
+                future.add_done_callback(lambda f: self._done(key, f))
+            else:
+                self.stats['coalesced'] += 1
+                pool = None
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # a worker died, e.g. it ran out of memory. The request fails,
+            # but later requests get a new pool
+            if pool is not None:
+                self._restart(pool)
+            raise
+
+    def _lookup(self, key):
+        """ returns a cached result or None, the lock must be held """
+        if key not in self._cache:
+            return None
+        self.stats['hits'] += 1
+        self._cache.move_to_end(key)
+        return self._cache[key]
+
+    def _restart(self, pool):
+        """
+        replaces a broken pool, unless this has already happened
+
+        :param pool: the broken pool
+
+        :return: the current pool
+        """
+        with self._lock:
+            if self._pool is pool:
+                self.stats['restarts'] += 1
+                self._pending.clear()
+                pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(max_workers=self._workers)
+            return self._pool
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+            if future.exception() is not None:
+                return
+            body = future.result()
+            if len(body) > self._cache_bytes or key in self._cache:
+                return
+            self._cache[key] = body
+            self._cached_bytes += len(body)
+            while self._cached_bytes > self._cache_bytes:
+                self._cached_bytes -= len(self._cache.popitem(last=False)[1])
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class WallRequestHandler(BaseHTTPRequestHandler):
+
+    service = None
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode('utf-8'))
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/stats':
+            self._send(200, json.dumps(self.service.stats).encode('utf-8'))
+        else:
+            self._error(404, 'not found')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/wall':
+            self._error(404, 'not found')
+            return
+
+        fmt = parse_qs(url.query).get('format', ['json'])[0]
+        if fmt not in FORMATS:
+            self._error(400, 'unknown format ' + fmt)
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            wall = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        except ValueError:
+            self._error(400, 'invalid JSON')
+            return
+        error = validate(wall)
+        if error is not None:
+            self._error(400, error)
+            return
+
+        try:
+            body = self.service.get(wall, fmt)
+        except BudgetExceeded as e:
+            self._error(413, str(e))
+            return
+        except Exception as e:
+            self._error(500, str(e))
+            return
+        self._send(200, body, FORMATS[fmt])
+
+
+def serve(host='127.0.0.1', port=8000, workers=None, cache_bytes=256e6, budget=None):
+    """
+    runs the service until it is interrupted
+
+    :param host: the address to listen on
+    :param port: the port to listen on
+    :param workers: number of worker processes
+    :param cache_bytes: maximum total size of the cached results in bytes
+    :param budget: the budget for STEP and STL requests, see `check_budget`
+    """
+    service = WallService(workers=workers, cache_bytes=cache_bytes, budget=budget)
+    handler = type('Handler', (WallRequestHandler,), {'service': service})
+    server = _ThreadingHTTPServer((host, port), handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP service for climbing wall configurations')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache-mb', type=float, default=256., help='maximum size of the result cache in MB')
+    parser.add_argument('--max-faces', type=int, default=DEFAULT_BUDGET['faces'],
+                        help='maximum number of faces of a STEP or STL wall')
+    parser.add_argument('--max-memory-mb', type=float, default=DEFAULT_BUDGET['memory'] * 1e-6,
+                        help='maximum estimated memory of a STEP or STL wall in MB')
+    parser.add_argument('--max-time', type=float, default=DEFAULT_BUDGET['time'],
+                        help='maximum estimated build time of a STEP or STL wall in s')
+    args = parser.parse_args()
+    budget = {'faces': args.max_faces,
+              'memory': args.max_memory_mb * 1e6,
+              'time': args.max_time}
+    serve(args.host, args.port, args.workers, args.cache_mb * 1e6, budget)
+
+
+if __name__ == '__main__':
+    main()
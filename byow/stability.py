@@ -0,0 +1,134 @@
+from byow.climbing_wall import climbing_wall
+from byow.parts import Panel
+
+GRAVITY = 9.81
+
+
+def mass_properties(parts, density=500.):
+    """
+    Aggregates the cached mass properties of a list of parts
+
+    :param parts: a list of Part instances
+    :param density: the wood density in kg/m^3
+
+    :return: a dict with the total mass in kg and the global
+             center of gravity (x, y, z) in mm
+    """
+    mass = 0.
+    moment = [0., 0., 0.]
+    for part in parts:
+        m = part.mass(density)
+        cog = part.center_of_gravity
+        mass += m
+        for i in range(3):
+            moment[i] += m * cog[i]
+    return {'mass': mass,
+            'cog': tuple(c / mass for c in moment)}
+
+
+def tipping(parts,
+            density=500.,
+            climber_mass=100.,
+            pull_ratio=0.5,
+            required_factor=1.5,
+            tol=1e-3):
+    """
+    Checks whether a climbing wall tips forward over the front ends
+    of its floor bars while a climber hangs at the top of the overhang.
+
+    The climber's weight acts at the topmost outer edge of the climbing
+    panels. Swinging and dynamic moves are modelled by an additional
+    horizontal force pulling the wall outwards, given as a fraction of
+    the climber's weight.
+
+    :param parts: a list of Part instances as returned by `climbing_wall`
+    :param density: the wood density in kg/m^3
+    :param climber_mass: the mass of the climber in kg
+    :param pull_ratio: the horizontal outward force as a fraction of
+                       the climber's weight
+    :param required_factor: the required ratio between the restoring
+                            and the overturning moment
+    :param tol: tolerance in mm for detecting parts on the ground
+
+    :return: a dict with the wall mass in kg, its center of gravity,
+             the restoring and overturning moments in Nm, their ratio
+             and the margin restoring - required_factor * overturning
+             in Nm
+    """
+    props = mass_properties(parts, density)
+
+    # the tipping edge is the outermost point touching the ground
+    ground = [c for part in parts for c in part.corners if c[2] < tol]
+    edge_y = min(c[1] for c in ground)
+
+    # the climber hangs at the outermost top corner of the panels
+    panel_corners = [c for part in parts if isinstance(part, Panel) for c in part.corners]
+    top_z = max(c[2] for c in panel_corners)
+    load_y = min(c[1] for c in panel_corners if c[2] > top_z - tol)
+
+    weight = climber_mass * GRAVITY
+    restoring = props['mass'] * GRAVITY * (props['cog'][1] - edge_y) * 1e-3
+    overturning = (pull_ratio * weight * top_z - weight * (load_y - edge_y)) * 1e-3
+
+    if overturning > 0:
+        factor = restoring / overturning
+    else:
+        factor = float('inf')
+
+    return {'mass': props['mass'],
+            'cog': props['cog'],
+            'restoring_moment': restoring,
+            'overturning_moment': overturning,
+            'factor': factor,
+            'margin': restoring - required_factor * overturning}
+
+
+def tipping_check(wall,
+                  density=500.,
+                  climber_mass=100.,
+                  pull_ratio=0.5,
+                  required_factor=1.5,
+                  max_safety=8000.,
+                  precision=1.):
+    """
+    Checks the tipping stability of a climbing wall and computes the
+    minimum safe foot length. Only part placements and cached mass
+    properties are evaluated, no shapes are built, so this is cheap
+    enough to be called on every parameter change.
+
+    :param wall: the wall dict with the keyword arguments of `climbing_wall`
+    :param density: the wood density in kg/m^3
+    :param climber_mass: the mass of the climber in kg
+    :param pull_ratio: the horizontal outward force as a fraction of
+                       the climber's weight
+    :param required_factor: the required ratio between the restoring
+                            and the overturning moment
+    :param max_safety: the largest foot length that is considered
+    :param precision: the precision of the minimum foot length in mm
+
+    :return: the dict returned by `tipping` with the additional key
+             'min_safety', the smallest foot length with a non-negative
+             margin, or None if even `max_safety` is not enough
+    """
+    def margin(safety):
+        parts = climbing_wall(**dict(wall, safety=safety))
+        return tipping(parts, density, climber_mass, pull_ratio, required_factor)['margin']
+
+    result = tipping(climbing_wall(**wall), density, climber_mass,
+                     pull_ratio, required_factor)
+
+    # the margin grows monotonically with the foot length
+    if margin(0.) >= 0:
+        result['min_safety'] = 0.
+    elif margin(max_safety) < 0:
+        result['min_safety'] = None
+    else:
+        lo, hi = 0., max_safety
+        while hi - lo > precision:
+            mid = (lo + hi) / 2.
+            if margin(mid) >= 0:
+                hi = mid
+            else:
+                lo = mid
+        result['min_safety'] = hi
+    return result
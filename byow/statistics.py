@@ -0,0 +1,149 @@
+"""
+Topology complexity, memory and build time accounting of the parts.
+
+The counts are predicted from the part parameters before anything is
+built, so that expensive recalculations can be refused or replaced
+by cheaper representations. Once a shape has been built, its real
+counts and build time are reported instead. Memory and time are
+rough estimates based on the calibration constants below.
+"""
+
+from byow.util import topology_counts
+
+# approximate B-rep memory per topological entity in bytes
+BREP_BYTES = {'faces': 1500, 'edges': 600, 'vertices': 150}
+
+# approximate tessellation of a planar face and of the wall of a hole
+TRIANGLES_PER_FACE = 12
+TRIANGLES_PER_HOLE = 128
+MESH_BYTES_PER_TRIANGLE = 60
+
+# approximate build time per face of an exact shape in seconds
+SECONDS_PER_FACE = 0.005
+
+# budgets for a whole wall. 'hole_markers' is the maximum number of
+# holes drawn with their outlines in the viewer, 'hole_points' the
+# maximum number drawn as points
+DEFAULT_BUDGET = {'faces': 50000,
+                  'memory': 1e9,
+                  'time': 60.,
+                  'hole_markers': 5000,
+                  'hole_points': 200000}
+
+
+def part_statistics(part, exact=True):
+    """
+    returns the statistics of a part
+
+    :param part: a Part instance
+    :param exact: If True, the exact shape is accounted, otherwise the light shape
+
+    :return: a dict with the part name, the number of faces, edges,
+             vertices and holes, the estimated B-rep and tessellation
+             memory in bytes, the estimated or measured build time in
+             seconds and whether the counts are measured
+    """
+    stats = dict(part._topology(exact))
+    built = exact and part._shape is not None
+    if built:
+        stats.update(topology_counts(part.shape))
+
+    holes = stats['holes'] if exact else 0
+    triangles = (stats['faces'] - holes) * TRIANGLES_PER_FACE + holes * TRIANGLES_PER_HOLE
+
+    stats['name'] = part.name
+    stats['brep_bytes'] = sum(stats[key] * BREP_BYTES[key] for key in BREP_BYTES)
+    stats['mesh_bytes'] = triangles * MESH_BYTES_PER_TRIANGLE
+    if built:
+        stats['time'] = part.build_time
+    else:
+        stats['time'] = stats['faces'] * SECONDS_PER_FACE if exact else 0.
+    stats['measured'] = built
+    return stats
+
+
+def wall_statistics(parts, exact=True):
+    """
+    returns the statistics of all parts and their totals
+
+    :param parts: a list of Part instances
+    :param exact: If True, the exact shapes are accounted, otherwise the light shapes
+
+    :return: a dict with the list of part statistics under 'parts' and
+             the summed values under 'total'
+    """
+    stats = []
+    seen = set()
+    for part in parts:
+        s = part_statistics(part, exact)
+        # parts with the same geometry share one shape, it is only built once
+        key = (type(part).__name__, part._geometry_key())
+        if key in seen and not s['measured']:
+            s['time'] = 0.
+        seen.add(key)
+        stats.append(s)
+    total = {}
+    for key in ('faces', 'edges', 'vertices', 'holes', 'brep_bytes', 'mesh_bytes', 'time'):
+        total[key] = sum(s[key] for s in stats)
+    return {'parts': stats, 'total': total}
+
+
+def shape_bytes(parts):
+    """
+    returns the estimated memory of the shapes that the parts hold right
+    now, i.e. the exact shapes where they have been built and the light
+    shapes otherwise
+
+    :param parts: a list of Part instances
+
+    :return: the estimated B-rep and tessellation memory in bytes
+    """
+    total = 0
+    for part in parts:
+        s = part_statistics(part, exact=part._shape is not None)
+        total += s['brep_bytes'] + s['mesh_bytes']
+    return total
+
+
+def check_budget(stats, budget=None):
+    """
+    compares the totals of `wall_statistics` with a budget
+
+    :param stats: the dict returned by `wall_statistics`
+    :param budget: a dict like DEFAULT_BUDGET, keys that are missing
+                   are not checked
+
+    :return: a list of warnings, empty if the budget is met
+    """
+    if budget is None:
+        budget = DEFAULT_BUDGET
+    total = stats['total']
+    warnings = []
+    if 'faces' in budget and total['faces'] > budget['faces']:
+        warnings.append(str(total['faces']) + ' faces exceed the budget of '
+                        + str(budget['faces']))
+    memory = total['brep_bytes'] + total['mesh_bytes']
+    if 'memory' in budget and memory > budget['memory']:
+        warnings.append('{:.0f} MB exceed the memory budget of {:.0f} MB'.format(
+            memory * 1e-6, budget['memory'] * 1e-6))
+    if 'time' in budget and total['time'] > budget['time']:
+        warnings.append('{:.0f} s build time exceed the budget of {:.0f} s'.format(
+            total['time'], budget['time']))
+    return warnings
+
+
+def statistics_to_str(stats):
+    """
+    returns a Markdown table of the statistics
+
+    :param stats: the dict returned by `wall_statistics`
+    """
+    out = "| part | faces | edges | vertices | B-rep | mesh | time |\n"
+    out += "|---|---|---|---|---|---|---|\n"
+    rows = stats['parts'] + [dict(stats['total'], name='**total**', measured=True)]
+    for s in rows:
+        out += ('| ' + s['name'] + ' | ' + str(s['faces']) + ' | ' + str(s['edges'])
+                + ' | ' + str(s['vertices'])
+                + ' | {:.1f} MB | {:.1f} MB | '.format(s['brep_bytes'] * 1e-6, s['mesh_bytes'] * 1e-6)
+                + ('' if s['measured'] else '~') + '{:.2f} s |\n'.format(s['time']))
+    return out
@@ -9,11 +9,21 @@ from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
 from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
 from OCC.Core.Addons import text_to_brep, Font_FontAspect_Bold
 from OCC.Core.TopExp import TopExp_Explorer
-from OCC.Core.TopAbs import TopAbs_EDGE
+from OCC.Core.TopAbs import TopAbs_EDGE, TopAbs_FACE, TopAbs_VERTEX
+from OCC.Core.TopExp import topexp_MapShapes
+from OCC.Core.TopTools import TopTools_IndexedMapOfShape
 from OCC.Core.STEPControl import STEPControl_Writer, STEPControl_AsIs
 from OCC.Core.Interface import Interface_Static_SetCVal
 from OCC.Core.IFSelect import IFSelect_RetDone
-
+from OCC.Core.StlAPI import StlAPI_Writer
+from OCC.Core.BRepTools import breptools_Write, breptools_Read
+from OCC.Core.TopoDS import TopoDS_Shape
+
+import hashlib
+import json
+import os
+import re
+import tempfile
 from math import radians
 
 
@@ -149,12 +159,14 @@ def get_boundingbox_shape(bb):
     return compound
 
 
-def make_compound(parts):
+def make_compound(parts, exact=True):
     """
     Takes a list of parts and returns a TopoDS_Compound
     from the parts' shapes.
 
     :param parts: A list of Part instances
+    :param exact: If True, the exact shapes are used, otherwise the
+                  cheaper light shapes, e.g. panels without holes
 
     :return: a TopoDS_Compound from all of the parts' shapes
     """
@@ -162,10 +174,77 @@ def make_compound(parts):
     builder = BRep_Builder()
     builder.MakeCompound(compound)
     for part in parts:
-        builder.Add(compound, part._shape)
+        builder.Add(compound, part.shape if exact else part.light_shape)
     return compound
 
 
+def part_hash(part):
+    """
+    Returns a hash of all parameters that determine the placed
+    geometry of a part, i.e. its geometry key and its placement
+
+    :param part: a Part instance
+
+    :return: a hex string
+    """
+    trsf = part.transformation
+    placement = tuple(round(trsf.Value(i, j), 6) for i in range(1, 4) for j in range(1, 5))
+    key = repr((type(part).__name__, part._geometry_key(), placement))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+MANIFEST = 'manifest.json'
+
+
+def export_to_directory(directory, parts, report=None):
+    """
+    Export every part to its own STEP file in a directory. A manifest
+    stores the hash of each part's parameters, so that on the next export
+    into the same directory only the parts that changed are written.
+    Files of parts that no longer exist are removed
+
+    :param directory: The output directory
+    :param parts: a list of Part instances with unique names
+    :param report: None or a function report(step, steps, message) that
+                   is called before each part
+
+    :return: a dict with the lists of 'written', 'skipped' and 'removed' files
+    """
+    manifest_file = os.path.join(directory, MANIFEST)
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            old = json.load(f)['parts']
+    except (IOError, ValueError, KeyError):
+        old = {}
+
+    new = {}
+    out = {'written': [], 'skipped': [], 'removed': []}
+    for i, part in enumerate(parts):
+        filename = re.sub(r'[^\w\-]+', '_', part.name or 'part_' + str(i + 1)).strip('_') + '.stp'
+        new[filename] = part_hash(part)
+        if old.get(filename) == new[filename] and os.path.exists(os.path.join(directory, filename)):
+            out['skipped'].append(filename)
+            continue
+        if report is not None:
+            report(i, len(parts), "Writing " + filename)
+        export_to_step(os.path.join(directory, filename), [part])
+        out['written'].append(filename)
+
+        # keep the manifest in sync with the files that have been written
+        old[filename] = new[filename]
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump({'parts': old}, f, indent=1, sort_keys=True)
+
+    for filename in set(old) - set(new):
+        if os.path.exists(os.path.join(directory, filename)):
+            os.remove(os.path.join(directory, filename))
+        out['removed'].append(filename)
+
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({'parts': new}, f, indent=1, sort_keys=True)
+    return out
+
+
 def export_to_step(filename, parts):
     """
     Export all the parts' shapes to a STEP file
@@ -183,3 +262,79 @@ def export_to_step(filename, parts):
 
     if status != IFSelect_RetDone:
         raise AssertionError("load failed")
+
+
+def export_to_stl(filename, parts, linear_deflection=0.5):
+    """
+    Export a triangulation of all the parts' shapes to a STL file
+
+    :param filename: The output STL file
+    :param parts: a list of Part instances
+    :param linear_deflection: the maximum distance in mm between
+                              the mesh and the exact surface
+
+    :return: None
+    """
+    compound = make_compound(parts)
+    mesh = BRepMesh_IncrementalMesh(compound, linear_deflection)
+    mesh.Perform()
+    if not mesh.IsDone():
+        raise AssertionError("Mesh not done.")
+    stl_writer = StlAPI_Writer()
+    stl_writer.SetASCIIMode(False)
+    if not stl_writer.Write(compound, filename):
+        raise AssertionError("write failed")
+
+
+def shape_to_string(shape):
+    """
+    Serializes a shape to a string in the BRep format, e.g. for
+    passing it between processes
+
+    :param shape: a TopoDS_Shape
+
+    :return: the BRep string
+    """
+    fd, filename = tempfile.mkstemp(suffix='.brep')
+    os.close(fd)
+    try:
+        breptools_Write(shape, filename)
+        with open(filename, 'r') as f:
+            return f.read()
+    finally:
+        os.remove(filename)
+
+
+def shape_from_string(brep):
+    """
+    Restores a shape from a string created by `shape_to_string`
+
+    :param brep: the BRep string
+
+    :return: a TopoDS_Shape
+    """
+    fd, filename = tempfile.mkstemp(suffix='.brep')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(brep)
+        shape = TopoDS_Shape()
+        breptools_Read(shape, filename, BRep_Builder())
+        return shape
+    finally:
+        os.remove(filename)
+
+
+def topology_counts(shape):
+    """
+    Counts the unique faces, edges and vertices of a shape
+
+    :param shape: a TopoDS_Shape
+
+    :return: a dict with the keys 'faces', 'edges' and 'vertices'
+    """
+    out = {}
+    for key, kind in (('faces', TopAbs_FACE), ('edges', TopAbs_EDGE), ('vertices', TopAbs_VERTEX)):
+        shape_map = TopTools_IndexedMapOfShape()
+        topexp_MapShapes(shape, kind, shape_map)
+        out[key] = shape_map.Size()
+    return out
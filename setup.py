@@ -22,6 +22,7 @@ setup(
     packages=find_packages(),
     long_description=read('README.md'),
     entry_points={
-        'console_scripts': ['byow=byow.gui:gui'],
+        'console_scripts': ['byow=byow.gui:gui',
+                            'byow-service=byow.service:main'],
     }
 )